@@ -66,8 +66,8 @@ async def get_recent_activity(limit: int = 20):
         
         # Get recent chat sessions - exclude large message arrays, include only summary fields
         chat_sessions = await db.chat_sessions.find(
-            {"messages": {"$exists": True, "$ne": []}},
-            {"_id": 0, "session_id": 1, "user_name": 1, "user_email": 1, "user_phone": 1, "created_at": 1, "updated_at": 1, "info_collected": 1}
+            {"$or": [{"message_count": {"$gt": 0}}, {"messages": {"$exists": True, "$ne": []}}]},
+            {"_id": 0, "session_id": 1, "user_name": 1, "user_email": 1, "user_phone": 1, "created_at": 1, "updated_at": 1, "info_collected": 1, "message_count": 1}
         ).sort("updated_at", -1).limit(limit).to_list(limit)
         
         # Get recent subscribers - with field projection
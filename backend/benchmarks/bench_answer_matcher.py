@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Approved-answer matching benchmark.
+
+Compares the original linear SequenceMatcher scan with the indexed
+ApprovedAnswerMatcher at several catalogue sizes, reporting per-message
+latency and how often both pick the same answer. Part of the catalogue and
+the messages are short questions made mostly of stop words ("what is the
+cost of this" against "what is the price of this"), which match on the
+shared stop words rather than on content words. Any disagreement with the
+linear scan is listed and fails the run.
+
+    python backend/benchmarks/bench_answer_matcher.py --sizes 500 5000 50000
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+
+# Loaded by path so the benchmark does not import the chatbot package (and its LLM client)
+_spec = importlib.util.spec_from_file_location(
+    "answer_matcher", os.path.join(os.path.dirname(__file__), '..', 'chatbot', 'answer_matcher.py')
+)
+answer_matcher = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(answer_matcher)
+
+OPENERS = ["what is", "how do i", "can you", "do you offer", "how much does", "where can i find",
+           "tell me about", "is there", "what are the", "who handles"]
+TOPICS = ["pricing", "automation", "consulting", "integration", "support", "onboarding", "security",
+          "analytics", "chatbot", "crm", "invoices", "refunds", "training", "api", "dashboard"]
+STOPWORD_TEMPLATES = ["what is the {} of this", "how do i get the {} for it", "can you tell me the {}",
+                      "is there a {} for that", "what are the {} you have"]
+SYNONYMS = {"pricing": "cost", "support": "help", "training": "courses", "api": "sdk", "refunds": "returns"}
+QUALIFIERS = ["for small teams", "for enterprises", "in europe", "per month", "with salesforce",
+              "on mobile", "for startups", "after signup", "during a trial", "with sso"]
+
+
+def make_answers(n: int, rng: random.Random):
+    answers = []
+    for i in range(n):
+        if rng.random() < 0.1:
+            pattern = rng.choice(STOPWORD_TEMPLATES).format(rng.choice(TOPICS))
+        else:
+            pattern = ' '.join([rng.choice(OPENERS), rng.choice(TOPICS), rng.choice(TOPICS), rng.choice(QUALIFIERS), f"plan{i % 997}"])
+        answers.append({
+            "id": f"answer-{i}",
+            "question_pattern": pattern,
+            "approved_answer": f"Approved answer {i}",
+            "context_tags": [rng.choice(TOPICS)] if rng.random() < 0.3 else []
+        })
+    return answers
+
+
+def make_messages(answers, n: int, rng: random.Random):
+    messages = []
+    for _ in range(n):
+        kind = rng.random()
+        pattern = rng.choice(answers)["question_pattern"]
+        if kind < 0.25:
+            messages.append(pattern.upper() + "?")  # repeated question
+        elif kind < 0.45:
+            # Stop-word-heavy paraphrase: only the topic word changes
+            topic = rng.choice(TOPICS)
+            messages.append(rng.choice(STOPWORD_TEMPLATES).format(SYNONYMS.get(topic, topic + "s")))
+        elif kind < 0.7:
+            words = pattern.split()
+            words[rng.randrange(len(words))] = rng.choice(TOPICS)  # paraphrase
+            messages.append("hi, " + ' '.join(words))
+        else:
+            messages.append(f"{rng.choice(OPENERS)} {rng.choice(TOPICS)} {rng.choice(QUALIFIERS)}")  # novel
+    return messages
+
+
+def linear_match(answers, user_message):
+    """The original _find_matching_approved_answer loop"""
+    user_lower = user_message.lower().strip()
+    best_match = None
+    best_score = 0.0
+    for answer in answers:
+        pattern = answer.get("question_pattern", "").lower().strip()
+        if pattern in user_lower or user_lower in pattern:
+            score = 0.95
+        else:
+            score = SequenceMatcher(None, user_lower, pattern).ratio()
+            user_words = set(user_lower.split())
+            pattern_words = set(pattern.split())
+            if pattern_words:
+                word_overlap = len(user_words & pattern_words) / len(pattern_words)
+                score = (score + word_overlap) / 2
+        if score > best_score and score >= 0.65:
+            best_score = score
+            best_match = answer
+    return best_match
+
+
+def timed(fn, messages):
+    samples = []
+    results = []
+    for message in messages:
+        start = time.perf_counter()
+        results.append(fn(message))
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)], results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5000, 50000])
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--linear-messages', type=int, default=30, help='the linear scan is slow at 50k')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'answers':>8}{'build ms':>10}{'linear p50':>12}{'index p50':>11}{'index p99':>11}{'agree':>8}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        answers = make_answers(size, rng)
+        messages = make_messages(answers, args.messages, rng)
+
+        start = time.perf_counter()
+        matcher = answer_matcher.ApprovedAnswerMatcher(answers)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def indexed(message):
+            match = matcher.match(message)
+            return match[0] if match else None
+
+        sample = messages[:args.linear_messages]
+        linear_p50, _, linear_results = timed(lambda m: linear_match(answers, m), sample)
+        index_p50, index_p99, index_results = timed(indexed, messages)
+
+        # Ties go to the older answer in both, so the very same answer is expected
+        mismatches = [
+            (message, expected, got)
+            for message, expected, got in zip(sample, linear_results, index_results)
+            if expected is not got
+        ]
+        agree = 1 - len(mismatches) / len(sample)
+        print(f"{size:>8}{build_ms:>10.0f}{linear_p50:>12.2f}{index_p50:>11.3f}{index_p99:>11.3f}{agree:>8.0%}")
+        for message, expected, got in mismatches:
+            print(f"  mismatch for {message!r}: linear {expected and expected['id']}, index {got and got['id']}")
+        failed = failed or bool(mismatches)
+
+    # The example that a content-word shortlist used to miss
+    answers = [{"id": "cost", "question_pattern": "what is the cost of this", "approved_answer": "..."}]
+    message = "what is the price of this"
+    expected = linear_match(answers, message)
+    match = answer_matcher.ApprovedAnswerMatcher(answers).match(message)
+    if (match[0] if match else None) is not expected:
+        print(f"  mismatch for {message!r}: linear {expected and expected['id']}, index {match and match[0]['id']}")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
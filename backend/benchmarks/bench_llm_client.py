@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Per-turn LLM transport overhead benchmark.
+
+Runs chat turns through litellm against a local OpenAI-compatible stub
+endpoint that answers after a fixed delay, and counts the TCP connections
+the stub accepts. Three ways of calling it are compared:
+
+- litellm default: acompletion with only a key and base URL, as the
+  emergentintegrations LlmChat calls it
+- fresh client: a new AsyncOpenAI client, and so a new connection pool,
+  for every message
+- shared client: chatbot/llm_client.py's LLMClient, with its pooled
+  keep-alive transport
+
+Against the real provider every new connection also costs a TLS handshake,
+so the connection count matters more than the stub's local latency. litellm
+caches a client of its own per key and base URL, so its default path reuses
+connections too; the shared client makes that explicit, with its own limits
+and keep-alive expiry, and is closed on shutdown.
+
+    python backend/benchmarks/bench_llm_client.py --turns 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import time
+
+# Keep litellm from fetching its model price list over the network
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+
+import litellm  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+STUB_DELAY = 0.005
+STUB_KEY = "sk-emergent-benchmark"
+STUB_BODY = json.dumps({
+    "id": "chatcmpl-benchmark",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "We can help with that."},
+        "finish_reason": "stop"
+    }],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 6, "total_tokens": 18}
+}).encode()
+
+connections = 0
+open_writers = set()
+
+
+def load_client_module():
+    """Load chatbot/llm_client.py by path, without the rest of the chatbot package"""
+    spec = importlib.util.spec_from_file_location(
+        "llm_client", os.path.join(os.path.dirname(__file__), '..', 'chatbot', 'llm_client.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def handle_stub(reader, writer):
+    """Minimal keep-alive HTTP server answering every POST after STUB_DELAY"""
+    global connections
+    connections += 1
+    open_writers.add(writer)
+    try:
+        while True:
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            await asyncio.sleep(STUB_DELAY)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(STUB_BODY)}\r\n\r\n".encode() + STUB_BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        open_writers.discard(writer)
+        writer.close()
+
+
+def messages(i):
+    return [
+        {"role": "system", "content": "prompt"},
+        {"role": "user", "content": f"question {i}"}
+    ]
+
+
+async def run_turns(turn, turns: int, concurrency: int):
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await turn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(turns)))
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+
+async def main():
+    global connections
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(handle_stub, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    api_base = f"http://127.0.0.1:{port}/v1"
+
+    module = load_client_module()
+    module.EMERGENT_PROXY_URL = api_base
+    shared = module.LLMClient(max_keepalive=args.concurrency)
+    shared.api_key = STUB_KEY
+
+    async def litellm_default_turn(i):
+        await litellm.acompletion(
+            model="openai/gpt-4o", messages=messages(i), api_key=STUB_KEY, api_base=api_base
+        )
+
+    async def fresh_client_turn(i):
+        client = AsyncOpenAI(api_key=STUB_KEY, base_url=api_base, max_retries=0)
+        try:
+            await litellm.acompletion(
+                model="openai/gpt-4o", messages=messages(i), api_key=STUB_KEY, api_base=api_base, client=client
+            )
+        finally:
+            await client.close()
+
+    async def shared_client_turn(i):
+        await shared.complete("prompt", f"question {i}", model="gpt-4o")
+
+    print(f"stub endpoint delay {STUB_DELAY * 1000:.0f} ms, {args.turns} turns, concurrency {args.concurrency}")
+    print(f"{'client':>16}{'p50 ms':>10}{'p99 ms':>10}{'overhead p50':>15}{'connections':>13}")
+    for name, turn in (
+        ("litellm default", litellm_default_turn),
+        ("fresh client", fresh_client_turn),
+        ("shared client", shared_client_turn)
+    ):
+        await turn(-1)  # imports and lazy setup stay out of the samples
+        connections = 0
+        p50, p99 = await run_turns(turn, args.turns, args.concurrency)
+        print(f"{name:>16}{p50:>10.2f}{p99:>10.2f}{p50 - STUB_DELAY * 1000:>15.2f}{connections:>13}")
+    print(f"shared client stats: {shared.get_stats()}")
+
+    await shared.close()
+    server.close()
+    # litellm keeps its own cached client's connections open
+    for writer in list(open_writers):
+        writer.close()
+    await server.wait_closed()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
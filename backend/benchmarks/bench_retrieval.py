@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Knowledge base retrieval benchmark.
+
+Compares the original full keyword-overlap scan against the indexed BM25
+store and the dense (hashed vector) mode on a synthetic corpus.
+
+    python backend/benchmarks/bench_retrieval.py --chunks 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from chatbot.knowledge_base import SimpleVectorStore  # noqa: E402
+
+
+def make_corpus(n_chunks: int, vocab_size: int, words_per_chunk: int, seed: int):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    # Zipf-like weights so a few words are everywhere, like crawled boilerplate
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    chunks = [' '.join(rng.choices(vocab, weights, k=words_per_chunk)) for _ in range(n_chunks)]
+    queries = [' '.join(rng.choices(vocab, weights, k=6)) for _ in range(200)]
+    return chunks, queries
+
+
+def legacy_scan(store_docs, question_keywords, n_results):
+    """The pre-index query loop: every document's keywords become a set on every call"""
+    scores = []
+    for doc in store_docs:
+        overlap = len(question_keywords & set(doc['keywords']))
+        if overlap > 0:
+            scores.append((overlap / len(question_keywords), doc['text']))
+    scores.sort(reverse=True, key=lambda x: x[0])
+    return [text for _, text in scores[:n_results]]
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--vocab', type=int, default=20000)
+    parser.add_argument('--words', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    chunks, queries = make_corpus(args.chunks, args.vocab, args.words, args.seed)
+    queries = queries[:args.queries]
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        os.environ['KB_COMPACT_EVERY'] = str(args.chunks + 1)
+        store = SimpleVectorStore(storage_dir)
+
+        start = time.perf_counter()
+        for i, chunk in enumerate(chunks):
+            store.add(f"bench_chunk_{i}", chunk)
+        legacy_docs = [store.documents[f"bench_chunk_{i}"] for i in range(len(chunks))]
+        legacy_docs = [{'text': d['text'], 'keywords': d['keywords']} for d in legacy_docs]
+        store.compact()
+        print(f"ingest + compact of {len(chunks)} chunks: {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        reopened = SimpleVectorStore(storage_dir)
+        print(f"cold open of segment: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        results = [
+            ('legacy scan', lambda q: legacy_scan(legacy_docs, set(store._extract_keywords(q)), 3)),
+            ('bm25 (indexed)', lambda q: reopened.query(q, 3, 'bm25')),
+            ('overlap (indexed)', lambda q: reopened.query(q, 3, 'overlap')),
+            ('dense (matvec)', lambda q: reopened.query(q, 3, 'dense')),
+        ]
+        print(f"{'mode':<20}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, fn in results:
+            p50, p95 = timed(fn, queries)
+            print(f"{name:<20}{p50:>10.2f}{p95:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Chat latency while a document upload is being parsed.
+
+A probe coroutine runs a knowledge base query every few milliseconds (the
+retrieval part of a chat turn) while a large PDF is ingested, and reports
+the probe's latency percentiles. "inline" is the original ingestion path
+(PyPDF2 on the event loop, += string building); "pool" is the process-pool
+parser with page-by-page chunking.
+
+    python backend/benchmarks/bench_upload_latency.py --pages 400
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PyPDF2  # noqa: E402
+from chatbot.knowledge_base import KnowledgeBase  # noqa: E402
+from chatbot.document_parser import document_parser  # noqa: E402
+
+
+def make_pdf(n_pages: int, words_per_page: int, seed: int) -> bytes:
+    """Build a minimal text PDF without extra dependencies"""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(5000)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for _ in range(n_pages):
+        lines = []
+        for _ in range(words_per_page // 10):
+            line = ' '.join(rng.choice(vocab) for _ in range(10))
+            lines.append(f"({line}) Tj T*")
+        stream = ("BT /F1 9 Tf 11 TL 40 800 Td " + ' '.join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = ' '.join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, n_pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def ingest_inline(kb: KnowledgeBase, content: bytes, filename: str):
+    """The original process_pdf body"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    kb.add_document(filename, text, {"source": filename, "type": "pdf"})
+
+
+async def probe(kb: KnowledgeBase, samples: list, stop: asyncio.Event, interval: float):
+    questions = ["what services do you offer", "term1 term2 pricing", "automation consulting term42"]
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        kb.query(questions[i % len(questions)])
+        # Oversleeping counts: that is the time a chat request waits for the loop
+        samples.append((time.perf_counter() - start - interval) * 1000)
+        i += 1
+
+
+async def run(mode: str, kb: KnowledgeBase, path: str, content: bytes, interval: float):
+    samples = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(kb, samples, stop, interval))
+    await asyncio.sleep(0.2)
+    baseline = len(samples)
+
+    start = time.perf_counter()
+    if mode == 'inline':
+        ingest_inline(kb, content, "inline.pdf")
+    else:
+        await kb.process_pdf(path, "pool.pdf")
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    during = sorted(samples[baseline:]) or [0.0]
+    p99 = during[max(0, int(len(during) * 0.99) - 1)]
+    print(f"{mode:<8}{elapsed:>10.2f}{len(during):>10}{statistics.median(during):>10.2f}{p99:>10.2f}{during[-1]:>10.2f}")
+
+
+async def main_async(args):
+    content = make_pdf(args.pages, args.words, args.seed)
+    with tempfile.TemporaryDirectory() as storage_dir:
+        kb = KnowledgeBase(storage_dir)
+        for i in range(args.chunks):
+            kb.store.add(f"seed_chunk_{i}", f"term{i % 5000} services automation consulting pricing term{i % 97}")
+
+        path = os.path.join(storage_dir, "upload.pdf")
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        print(f"{len(content) / 1e6:.1f} MB PDF, {args.pages} pages")
+        print(f"{'mode':<8}{'upload s':>10}{'probes':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        # Warm the pool so its start-up cost is not charged to the first run
+        async for _ in document_parser.iter_pages(path, "pdf"):
+            pass
+        for mode in ('inline', 'pool'):
+            await run(mode, kb, path, content, args.interval / 1000)
+        document_parser.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--words', type=int, default=400)
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--interval', type=float, default=5.0, help='probe interval in ms')
+    parser.add_argument('--seed', type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Admission control for LLM calls.
+
+At most LLM_MAX_IN_FLIGHT calls run at once per worker. Further calls wait
+in a bounded FIFO queue; when the queue is full they are rejected at once,
+and when they wait longer than LLM_QUEUE_TIMEOUT_SECONDS they give up.
+Both rejections carry a Retry-After estimate for the client.
+
+Chat turns are also coalesced: an identical message for the same session
+arriving while the first is still being answered (a double-clicked send)
+shares the first turn's result instead of starting another one.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', '32'))
+MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', '64'))
+QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT_SECONDS', '10'))
+WAIT_WINDOW = 500
+
+
+class AdmissionRejected(Exception):
+    """The LLM is at capacity; status_code is 429 (queue full) or 503 (waited too long)"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE, queue_timeout: float = QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+        self.waits: Deque[float] = deque(maxlen=WAIT_WINDOW)
+        self.durations: Deque[float] = deque(maxlen=WAIT_WINDOW)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.coalesced = 0
+        self.max_queue_depth = 0
+
+    def is_full(self) -> bool:
+        return self.in_flight >= self.max_in_flight and len(self._waiters) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new caller has likely drained"""
+        typical = sorted(self.durations)[len(self.durations) // 2] if self.durations else 1.0
+        rounds = (len(self._waiters) + 1) / max(1, self.max_in_flight)
+        return max(1, math.ceil(typical * rounds))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the in-flight slots for the duration of an LLM call"""
+        started = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            await self._wait_for_slot()
+        self.admitted += 1
+        self.waits.append(time.monotonic() - started)
+
+        call_started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.durations.append(time.monotonic() - call_started)
+            self._release()
+
+    async def _wait_for_slot(self):
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected(429, "queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            # The slot is handed over by _release, so in_flight is already counted
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted just as the timeout fired - keep the slot
+                return
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(503, "queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the oldest waiter so nobody can jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def coalesce(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[asyncio.Task, bool]:
+        """
+        Start factory() as a task unless an identical one is in flight.
+        Returns (task, joined) - joined is True for a duplicate sharing an
+        earlier task. Await the task through asyncio.shield so one caller
+        disconnecting does not cancel it for the others.
+        """
+        task = self._pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task, True
+
+        task = asyncio.ensure_future(factory())
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task, False
+
+    @staticmethod
+    def _percentile(samples: Deque[float], q: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def get_stats(self) -> Dict:
+        p50 = self._percentile(self.waits, 0.5)
+        p95 = self._percentile(self.waits, 0.95)
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_queue_depth,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "coalesced": self.coalesced,
+            "turns_in_progress": len(self._pending),
+            "wait_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "wait_p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+# Global instance
+admission = AdmissionController()
@@ -1,37 +1,17 @@
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-import os
 import logging
 from typing import Dict, List, Optional
 from .knowledge_base import knowledge_base
+from .llm_client import llm_client
+from .llm_guard import llm_guard
+from .admission import AdmissionRejected, admission
 import re
 
 logger = logging.getLogger(__name__)
 
 class AIService:
     def __init__(self):
-        self.api_key = None
         logger.info("AI Service initialized")
     
-    def _get_api_key(self):
-        if not self.api_key:
-            from dotenv import load_dotenv
-            load_dotenv()
-            self.api_key = os.environ.get('EMERGENT_LLM_KEY')
-            if not self.api_key:
-                raise ValueError("EMERGENT_LLM_KEY not found in environment")
-        return self.api_key
-    
-    def create_chat(self, session_id: str, system_message: str) -> LlmChat:
-        """Create a new chat instance"""
-        api_key = self._get_api_key()
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=session_id,
-            system_message=system_message
-        )
-        chat.with_model("openai", "gpt-4o")
-        return chat
-    
     async def generate_response(
         self,
         session_id: str,
@@ -87,10 +67,12 @@ Context from our knowledge base:
 
 Provide helpful, accurate answers based on the context. If you don't have specific information, provide general guidance and invite them to contact us directly for more details."""
             
-            chat = self.create_chat(session_id, system_message)
-            
             # Get response
-            response = await chat.send_message(UserMessage(text=user_message))
+            async def send(model: str, token_sink) -> str:
+                return await llm_client.complete(system_message, user_message, model=model)
+            
+            async with admission.slot():
+                response = await llm_guard.call(send)
             is_answered = self._is_question_answered(response, context)
             
             return {
@@ -101,6 +83,8 @@ Provide helpful, accurate answers based on the context. If you don't have specif
                 "info_complete": all([user_info.get('name'), user_info.get('email'), user_info.get('phone')])
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return {
@@ -0,0 +1,228 @@
+"""
+Index over approved answers for matching incoming chat messages.
+
+Matching keeps the scoring of the original linear scan - a substring match
+either way scores 0.95, otherwise the SequenceMatcher ratio averaged with the
+share of pattern words found in the message - and returns the same answer,
+but only scores patterns that can still reach the threshold:
+
+    exact     normalized pattern -> answer ids, an O(1) hit for repeated questions
+    anchors   each pattern under its rarest character trigram, to find patterns
+              contained in the message
+    grams     trigram -> answer ids, to find patterns containing the message
+    words     word -> answer ids, every word including stop words, to find
+              fuzzy candidates
+
+A fuzzy score is at most (1 + word overlap) / 2, so a pattern sharing no word
+with the message cannot reach SIMILARITY_THRESHOLD; one that shares words is
+bounded by its exact word overlap and the length bound of the ratio, and
+SequenceMatcher only runs while that bound can beat the best score so far.
+"""
+import heapq
+import math
+from collections import Counter
+from itertools import chain
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+# Minimum similarity for a match; above 0.5, so a match always shares a word
+SIMILARITY_THRESHOLD = 0.65
+SUBSTRING_SCORE = 0.95
+
+# Message-in-pattern candidates are narrowed until at most this many remain
+SHORTLIST_SIZE = 20
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ApprovedAnswerMatcher:
+    def __init__(self, answers: Iterable[Dict] = ()):
+        self._entries: Dict[str, Dict] = {}  # answer id -> answer, pattern and index keys
+        self._exact: Dict[str, Set[str]] = {}
+        self._anchors: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._words: Dict[str, Set[str]] = {}
+        # answer id -> (fewest shared words that can reach the threshold, word count, pattern length, order)
+        self._shapes: Dict[str, Tuple[int, int, int, int]] = {}
+        self._short: Set[str] = set()  # patterns too short to have a trigram
+        self._sequence = 0  # insertion order, so ties go to the older answer like the linear scan
+        for answer in answers:
+            self.upsert(answer)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ----- maintenance -----
+
+    def upsert(self, answer: Dict):
+        """Add an answer, or re-index it if its id is already present"""
+        answer_id = answer.get("id")
+        if not answer_id:
+            return
+        order = self._entries[answer_id]["order"] if answer_id in self._entries else None
+        self.remove(answer_id)
+
+        pattern = normalize(answer.get("question_pattern", ""))
+        if not pattern:
+            # An empty pattern would be a substring of every message
+            return
+        words = set(pattern.split())
+        grams = _trigrams(pattern)
+        if order is None:
+            order = self._sequence
+            self._sequence += 1
+
+        # Rarest trigram at insertion time - any trigram is correct, a rare one keeps lookups short
+        anchor = min(grams, key=lambda gram: len(self._grams.get(gram, ()))) if grams else None
+
+        entry = {
+            "answer": answer,
+            "pattern": pattern,
+            "words": words,
+            "grams": grams,
+            "anchor": anchor,
+            "order": order
+        }
+        self._entries[answer_id] = entry
+
+        self._exact.setdefault(pattern, set()).add(answer_id)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(answer_id)
+        for word in words:
+            self._words.setdefault(word, set()).add(answer_id)
+        # The ratio is at most 1, so overlap must be at least 2 * threshold - 1
+        min_shared = max(1, math.ceil((2 * SIMILARITY_THRESHOLD - 1) * len(words) - 1e-9))
+        self._shapes[answer_id] = (min_shared, len(words), len(pattern), order)
+        if anchor:
+            self._anchors.setdefault(anchor, set()).add(answer_id)
+        else:
+            self._short.add(answer_id)
+
+    def remove(self, answer_id: str) -> bool:
+        entry = self._entries.pop(answer_id, None)
+        if entry is None:
+            return False
+
+        _discard(self._exact, entry["pattern"], answer_id)
+        for gram in entry["grams"]:
+            _discard(self._grams, gram, answer_id)
+        for word in entry["words"]:
+            _discard(self._words, word, answer_id)
+        del self._shapes[answer_id]
+        if entry["anchor"]:
+            _discard(self._anchors, entry["anchor"], answer_id)
+        self._short.discard(answer_id)
+        return True
+
+    # ----- matching -----
+
+    def match(self, message: str) -> Optional[Tuple[Dict, float]]:
+        """Find the best approved answer for a message, as (answer, score)"""
+        text = normalize(message)
+        if not text or not self._entries:
+            return None
+
+        exact = self._pick(self._exact.get(text, ()))
+        if exact:
+            return self._entries[exact]["answer"], SUBSTRING_SCORE
+
+        substring = self._pick(
+            answer_id for answer_id in self._substring_candidates(text) if self._is_substring(answer_id, text)
+        )
+        best_id, best_score = (substring, SUBSTRING_SCORE) if substring else (None, 0.0)
+
+        words = set(text.split())
+        for bound, word_overlap, answer_id in self._fuzzy_candidates(text, words):
+            if bound < max(best_score, SIMILARITY_THRESHOLD):
+                break
+            if self._is_substring(answer_id, text):
+                # Substrings score SUBSTRING_SCORE, never their fuzzy score
+                continue
+
+            matcher = SequenceMatcher(None, text, self._entries[answer_id]["pattern"])
+            # Cheap upper bounds first - ratio() is the expensive part
+            if (matcher.quick_ratio() + word_overlap) / 2 < max(best_score, SIMILARITY_THRESHOLD):
+                continue
+            score = (matcher.ratio() + word_overlap) / 2
+            if score >= SIMILARITY_THRESHOLD and (
+                score > best_score or
+                # The linear scan keeps the first of equal scores
+                (score == best_score and self._entries[answer_id]["order"] < self._entries[best_id]["order"])
+            ):
+                best_id, best_score = answer_id, score
+
+        if best_id is None:
+            return None
+        return self._entries[best_id]["answer"], best_score
+
+    def _pick(self, answer_ids: Iterable[str]) -> Optional[str]:
+        """Oldest of the ids, or None"""
+        return min(answer_ids, key=lambda answer_id: self._entries[answer_id]["order"], default=None)
+
+    def _is_substring(self, answer_id: str, text: str) -> bool:
+        pattern = self._entries[answer_id]["pattern"]
+        return pattern in text or text in pattern
+
+    def _substring_candidates(self, text: str) -> Set[str]:
+        candidates = set(self._short)
+        grams = _trigrams(text)
+
+        # Patterns inside the message: their anchor trigram must be in the message
+        for gram in grams:
+            candidates |= self._anchors.get(gram, set())
+
+        # Message inside a pattern: the pattern has every message trigram
+        containing = None
+        for gram in sorted(grams, key=lambda gram: len(self._grams.get(gram, ()))):
+            posting = self._grams.get(gram, set())
+            containing = set(posting) if containing is None else containing & posting
+            if len(containing) <= SHORTLIST_SIZE:
+                break
+        return candidates | (containing or set())
+
+    def _fuzzy_candidates(self, text: str, words: Set[str]) -> Iterator[Tuple[float, float, str]]:
+        """
+        Every pattern whose score could reach the threshold, as (score upper
+        bound, word overlap, id), best bound first and older answers first
+        among equal bounds. Produced lazily - matching usually stops early.
+        """
+        # Counting over chained postings runs in C; the loops below are the hot part at large catalogues
+        shared = Counter(chain.from_iterable(self._words.get(word, ()) for word in words))
+        shapes = self._shapes
+        text_length = len(text)
+        # Compared against -bound, so the heap pops the best bound first
+        limit = -2 * SIMILARITY_THRESHOLD
+
+        heap = []
+        for answer_id, count in shared.items():
+            min_shared, word_count, pattern_length, order = shapes[answer_id]
+            if count < min_shared:
+                continue
+            # SequenceMatcher ratio is at most 2 * min(len) / (sum of lens)
+            if pattern_length < text_length:
+                length_bound = 2 * pattern_length / (text_length + pattern_length)
+            else:
+                length_bound = 2 * text_length / (text_length + pattern_length)
+            word_overlap = count / word_count
+            negated = -(length_bound + word_overlap)
+            if negated <= limit:
+                heap.append((negated, order, word_overlap, answer_id))
+
+        heapq.heapify(heap)
+        while heap:
+            negated, _, word_overlap, answer_id = heapq.heappop(heap)
+            yield -negated / 2, word_overlap, answer_id
+
+
+def _discard(index: Dict[str, Set[str]], key: str, answer_id: str):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(answer_id)
+        if not ids:
+            del index[key]
@@ -0,0 +1,71 @@
+"""
+Cross-process cache invalidation through version counters in Mongo.
+
+Write endpoints bump a named counter and record which ids changed. Readers
+poll the counter every few seconds and, when it has moved, patch just those
+ids - or reload everything if they missed part of the change log. Bumps made
+in this process are also counted locally so its own caches sync on the next
+request without waiting for a poll.
+"""
+import os
+import logging
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+APPROVED_ANSWERS = "approved_answers"
+
+POLL_INTERVAL = float(os.environ.get('CACHE_VERSION_POLL_SECONDS', '5'))
+
+# Recent changes kept per counter; readers further behind do a full reload
+CHANGE_LOG_SIZE = 200
+
+_local_versions: Dict[str, int] = {}
+
+
+def local_version(name: str) -> int:
+    """Number of bumps made by this process"""
+    return _local_versions.get(name, 0)
+
+
+async def bump_version(db, name: str, changed_ids: List[str]) -> Optional[int]:
+    """Record a change to the given ids, returns the new version (None if Mongo is unavailable)"""
+    _local_versions[name] = local_version(name) + 1
+    try:
+        state = await db.cache_versions.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        version = state["version"]
+        # Readers that see the new version before this entry treat it as a gap and reload
+        await db.cache_versions.update_one(
+            {"_id": name},
+            {"$push": {"changes": {
+                "$each": [{"version": version, "ids": changed_ids}],
+                "$slice": -CHANGE_LOG_SIZE
+            }}}
+        )
+        return version
+    except Exception as e:
+        logger.warning(f"Failed to bump cache version {name}: {e}")
+        return None
+
+
+async def get_version_state(db, name: str) -> Dict:
+    """Get {"version": n, "changes": [...]} for a counter"""
+    state = await db.cache_versions.find_one({"_id": name})
+    return state or {"version": 0, "changes": []}
+
+
+def changed_since(state: Dict, version: int) -> Optional[List[str]]:
+    """Ids changed after the given version, or None if the change log no longer covers it"""
+    changes = {change["version"]: change["ids"] for change in state.get("changes", [])}
+    changed = []
+    for missed in range(version + 1, state.get("version", 0) + 1):
+        if missed not in changes:
+            return None
+        changed.extend(changes[missed])
+    return list(dict.fromkeys(changed))
@@ -0,0 +1,95 @@
+"""
+Token-budgeted context assembly for LLM prompts.
+
+Rankings from several retrieval modes are merged with reciprocal-rank
+fusion, near-duplicate chunks (overlapping crawl pages, repeated headers)
+are dropped, and the best remaining chunks are packed into a fixed token
+budget before they go into the system prompt.
+"""
+import os
+import logging
+from typing import Dict, List, Set, Tuple
+from .knowledge_base import knowledge_base
+from . import dense_index
+from .text_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Standard RRF damping constant - keeps one mode's top hit from dominating
+RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, float, str]]], k: int = RRF_K) -> List[Tuple[str, float, str]]:
+    """Fuse (doc id, score, text) rankings into one list ordered by RRF score"""
+    fused: Dict[str, float] = {}
+    texts: Dict[str, str] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _, text) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+            texts[doc_id] = text
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [(doc_id, score, texts[doc_id]) for doc_id, score in ordered]
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def is_near_duplicate(shingles: Set, selected: List[Set], threshold: float) -> bool:
+    """Containment of the smaller shingle set in the larger one, so a chunk that repeats part of another counts too"""
+    for other in selected:
+        smaller = min(len(shingles), len(other))
+        if smaller and len(shingles & other) / smaller >= threshold:
+            return True
+    return False
+
+
+class ContextAssembler:
+    def __init__(self):
+        self.token_budget = int(os.environ.get('KB_CONTEXT_TOKEN_BUDGET', '600'))
+        self.candidates = int(os.environ.get('KB_CONTEXT_CANDIDATES', '10'))
+        self.dedup_threshold = float(os.environ.get('KB_CONTEXT_DEDUP_THRESHOLD', '0.8'))
+        modes = os.environ.get('KB_FUSION_MODES', 'bm25,dense')
+        self.modes = [mode.strip() for mode in modes.split(',') if mode.strip()]
+    
+    def assemble(self, question: str, token_budget: int = None) -> str:
+        """Build the knowledge base section of the prompt for a question"""
+        chunks = self.select(question, token_budget)
+        return "\n\n".join(chunks)
+    
+    def select(self, question: str, token_budget: int = None) -> List[str]:
+        """Pick fused, de-duplicated chunks that fit the token budget, best first"""
+        budget = token_budget or self.token_budget
+        
+        rankings = []
+        for mode in self.modes:
+            if mode == 'dense' and not dense_index.is_available():
+                continue
+            ranking = knowledge_base.search(question, self.candidates, mode)
+            if ranking:
+                rankings.append(ranking)
+        
+        selected = []
+        selected_shingles = []
+        used = 0
+        for _, _, text in reciprocal_rank_fusion(rankings):
+            shingles = _shingles(text)
+            if is_near_duplicate(shingles, selected_shingles, self.dedup_threshold):
+                continue
+            
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                # A smaller, lower-ranked chunk may still fit
+                continue
+            
+            selected.append(text)
+            selected_shingles.append(shingles)
+            used += cost
+        
+        logger.debug(f"Assembled {len(selected)} chunks (~{used} tokens) from {len(rankings)} rankings")
+        return selected
+
+# Global instance
+context_assembler = ContextAssembler()
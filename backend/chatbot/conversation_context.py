@@ -0,0 +1,201 @@
+"""
+Conversation context for LLM prompts.
+
+The prompt carries the last CHAT_CONTEXT_TURNS turns verbatim - newest
+first, until CHAT_CONTEXT_TOKENS are used up - after a rolling summary of
+everything older. The summary is stored on the session as
+conversation_summary, {"text", "through_seq"}, and covers the messages with
+seq < through_seq. It is refreshed in the background once a turn has been
+answered and enough messages have left the verbatim window; until then
+those messages are simply left out. Both parts have fixed token budgets, so
+the prompt stays the same size however long a session runs.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from .text_utils import CHARS_PER_TOKEN, estimate_tokens
+from .llm_client import llm_client
+from .llm_guard import llm_guard
+from .model_router import FAST, TIER_MODELS
+from .admission import admission
+from .message_store import load_range
+from .session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TURNS = int(os.environ.get('CHAT_CONTEXT_TURNS', '6'))
+CONTEXT_TOKENS = int(os.environ.get('CHAT_CONTEXT_TOKENS', '800'))
+SUMMARY_TOKENS = int(os.environ.get('CHAT_SUMMARY_TOKENS', '250'))
+# Messages outside the verbatim window that trigger a summary refresh
+SUMMARY_EVERY = int(os.environ.get('CHAT_SUMMARY_EVERY_MESSAGES', '4'))
+# Most of the unsummarized messages folded in by one refresh; the rest wait for the next one
+SUMMARY_INPUT_TOKENS = int(os.environ.get('CHAT_SUMMARY_INPUT_TOKENS', '2000'))
+SUMMARY_TIMEOUT = float(os.environ.get('CHAT_SUMMARY_TIMEOUT_SECONDS', '30'))
+
+SPEAKERS = {"user": "Visitor", "bot": "Zia"}
+
+SUMMARY_SYSTEM_MESSAGE = f"""You maintain a running summary of a website chat between a visitor and Zia, the assistant of Zentiam, an AI consulting company.
+Merge the new messages into the existing summary. Keep what the visitor said about their business, needs, challenges and questions, what Zia recommended or promised, and anything still open.
+Leave out greetings and small talk. Write plain sentences, at most {SUMMARY_TOKENS * CHARS_PER_TOKEN // 6} words, and reply with the summary only."""
+
+
+def _truncate(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + " ..."
+
+
+def _line(message: Dict) -> str:
+    return f"{SPEAKERS.get(message.get('sender'), 'Zia')}: {message.get('message', '')}"
+
+
+class ConversationContextBuilder:
+    def __init__(
+        self,
+        turns: int = CONTEXT_TURNS,
+        token_budget: int = CONTEXT_TOKENS,
+        summary_tokens: int = SUMMARY_TOKENS,
+        summary_every: int = SUMMARY_EVERY
+    ):
+        self.turns = turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summary_every = summary_every
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.refreshed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.stale = 0
+        self.last_refresh_ms: Optional[float] = None
+
+    def render(self, history: List[Dict], summary: Optional[Dict]) -> str:
+        """Prompt section with the summary and the recent turns, empty for a new conversation"""
+        summarized_through = (summary or {}).get("through_seq", 0)
+        lines = []
+        used = 0
+        for message in reversed(history[-2 * self.turns:]):
+            if message.get("seq", summarized_through) < summarized_through:
+                break
+            line = _line(message)
+            cost = estimate_tokens(line)
+            if used + cost > self.token_budget:
+                if not lines:
+                    # A single long message still gets its beginning in
+                    lines.append(_truncate(line, self.token_budget))
+                break
+            lines.append(line)
+            used += cost
+        lines.reverse()
+
+        parts = []
+        if summary and summary.get("text"):
+            parts.append(f"Summary of the earlier conversation: {_truncate(summary['text'], self.summary_tokens)}")
+        if lines:
+            parts.append("Recent messages (oldest first):\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+    def _summary_target(self, message_count: int) -> int:
+        """Sequence number the summary should reach - everything before the verbatim window"""
+        return max(0, message_count - 2 * self.turns)
+
+    def schedule_refresh(self, db, session: Dict, recent: List[Dict]) -> bool:
+        """
+        Start a background summary refresh when enough messages have left
+        the verbatim window. recent are the latest messages already at hand;
+        anything older that is needed is read from the buckets.
+        """
+        session_id = session["session_id"]
+        summary = session.get("conversation_summary")
+        start = (summary or {}).get("through_seq", 0)
+        target = self._summary_target(session.get("message_count", 0))
+        if target - start < self.summary_every or session_id in self._refreshing:
+            return False
+
+        task = asyncio.get_running_loop().create_task(
+            self._refresh(db, session_id, summary, start, target, recent)
+        )
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(session_id, None))
+        return True
+
+    async def _refresh(self, db, session_id: str, summary: Optional[Dict], start: int, target: int, recent: List[Dict]):
+        """
+        Fold messages from start towards target into the summary, oldest
+        first, as many as fit SUMMARY_INPUT_TOKENS, and store it
+        """
+        # Background work only uses spare capacity; the next turn tries again
+        if (
+            not llm_client.has_api_key() or
+            llm_guard.is_degraded([TIER_MODELS[FAST]]) or
+            admission.in_flight >= admission.max_in_flight
+        ):
+            self.skipped += 1
+            return
+
+        try:
+            messages = [message for message in recent if start <= message.get("seq", -1) < target]
+            if len(messages) != target - start:
+                messages = await load_range(db, session_id, start, target - 1)
+
+            # Oldest first within the input budget; a long backlog is caught up over several refreshes
+            lines = []
+            used = 0
+            through = start
+            for message in messages:
+                line = _line(message)
+                used += estimate_tokens(line)
+                if used > SUMMARY_INPUT_TOKENS and lines:
+                    break
+                lines.append(_truncate(line, SUMMARY_INPUT_TOKENS))
+                through = message.get("seq", through) + 1
+
+            previous = (summary or {}).get("text") or "(none yet)"
+            prompt = f"Existing summary:\n{previous}\n\nNew messages:\n" + "\n".join(lines)
+
+            started = time.monotonic()
+            async with admission.slot():
+                text = await asyncio.wait_for(
+                    llm_client.complete(SUMMARY_SYSTEM_MESSAGE, prompt, model=TIER_MODELS[FAST]),
+                    SUMMARY_TIMEOUT
+                )
+            self.last_refresh_ms = round((time.monotonic() - started) * 1000, 1)
+
+            new_summary = {
+                "text": _truncate(text.strip(), self.summary_tokens),
+                "through_seq": through,
+                "updated_at": datetime.utcnow()
+            }
+            # Never overwrite a summary another worker has moved on meanwhile
+            current = {"conversation_summary.through_seq": start} if summary else {"conversation_summary": None}
+            result = await db.chat_sessions.update_one(
+                {"session_id": session_id, **current},
+                {"$set": {"conversation_summary": new_summary}}
+            )
+            if result.modified_count:
+                session_cache.update(session_id, {"conversation_summary": new_summary})
+                self.refreshed += 1
+            else:
+                self.stale += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Could not refresh conversation summary of session {session_id}: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "turns": self.turns,
+            "token_budget": self.token_budget,
+            "summary_tokens": self.summary_tokens,
+            "refreshes_in_progress": len(self._refreshing),
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "stale": self.stale,
+            "last_refresh_ms": self.last_refresh_ms
+        }
+
+# Global instance
+conversation_context_builder = ConversationContextBuilder()
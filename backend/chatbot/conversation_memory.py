@@ -0,0 +1,86 @@
+"""
+Conversation memory - what a visitor has told us about themselves.
+
+The memory (industry, challenges, topics) is stored on the session as
+conversation_memory and updated from each new user message only, so a turn
+costs the same however long the conversation is. messages_seen is the
+message_count the memory was derived through; when it does not match the
+session the memory is rebuilt from the messages at hand.
+
+Sessions from before the memory was stored are filled in by
+scripts/backfill_conversation_memory.py.
+"""
+from typing import Dict, List, Optional
+
+INDUSTRIES = {
+    'healthcare': ['healthcare', 'medical', 'hospital', 'clinic', 'patient'],
+    'finance': ['finance', 'banking', 'financial', 'investment', 'trading'],
+    'retail': ['retail', 'ecommerce', 'e-commerce', 'store', 'shopping'],
+    'manufacturing': ['manufacturing', 'factory', 'production', 'assembly'],
+    'logistics': ['logistics', 'shipping', 'supply chain', 'warehouse'],
+    'technology': ['tech', 'software', 'saas', 'startup', 'app']
+}
+
+CHALLENGE_KEYWORDS = ['struggling', 'challenge', 'problem', 'issue', 'difficult', 'pain point', 'bottleneck']
+
+# Challenges kept on the session, most recent last
+MAX_CHALLENGES = 5
+
+
+def empty_memory() -> Dict:
+    return {
+        "user_industry": None,
+        "user_company_size": None,
+        "user_challenges": [],
+        "topics_discussed": [],
+        "questions_asked": [],
+        "user_interests": [],
+        "messages_seen": 0
+    }
+
+
+def _topics(text: str) -> List[str]:
+    topics = []
+    if 'pricing' in text or 'cost' in text:
+        topics.append('pricing')
+    if 'automation' in text:
+        topics.append('automation')
+    if 'chatbot' in text or 'chat bot' in text:
+        topics.append('chatbots')
+    if 'data' in text and ('analysis' in text or 'analytics' in text):
+        topics.append('data analytics')
+    return topics
+
+
+def update_memory(memory: Optional[Dict], message: str, messages_seen: int) -> Dict:
+    """Fold one user message into memory; returns a new dict"""
+    updated = {**empty_memory(), **(memory or {})}
+    updated["user_challenges"] = list(updated["user_challenges"])
+    updated["topics_discussed"] = list(updated["topics_discussed"])
+    text = message.lower()
+
+    # The latest industry mentioned wins
+    for industry, keywords in INDUSTRIES.items():
+        if any(kw in text for kw in keywords):
+            updated["user_industry"] = industry
+            break
+
+    if any(kw in text for kw in CHALLENGE_KEYWORDS):
+        updated["user_challenges"] = (updated["user_challenges"] + [text[:100]])[-MAX_CHALLENGES:]
+
+    for topic in _topics(text):
+        if topic not in updated["topics_discussed"]:
+            updated["topics_discussed"].append(topic)
+
+    updated["messages_seen"] = messages_seen
+    return updated
+
+
+def build_memory(messages: List[Dict], messages_seen: Optional[int] = None) -> Dict:
+    """Memory of a list of messages, from scratch"""
+    memory = empty_memory()
+    for msg in messages:
+        if msg.get("sender") == "user":
+            memory = update_memory(memory, msg.get("message", ""), memory["messages_seen"])
+    memory["messages_seen"] = len(messages) if messages_seen is None else messages_seen
+    return memory
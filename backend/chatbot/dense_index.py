@@ -0,0 +1,71 @@
+"""
+Offline dense retrieval for the knowledge store.
+
+Chunks are embedded with signed feature hashing: word tokens plus their
+character trigrams are hashed into a fixed number of dimensions with a +/-1
+sign, which is a sparse random projection of the TF vector. Trigrams let
+inflections and close word forms ("automate" / "automation") land near each
+other. Vectors are L2-normalized float32, so scoring a query is one
+matrix-vector product and top-k is an argpartition.
+
+No network calls or model downloads are involved.
+"""
+import math
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Dense mode is unavailable, keyword modes keep working
+    np = None
+
+DENSE_DIM = int(os.environ.get('KB_DENSE_DIM', '256'))
+
+# Trigrams are noisier than whole words, so they count for less
+TRIGRAM_WEIGHT = 0.5
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+def _features(term_freqs: Dict[str, int]) -> Dict[str, float]:
+    counts = {}
+    for term, tf in term_freqs.items():
+        counts[term] = counts.get(term, 0) + float(tf)
+        padded = f"#{term}#"
+        for i in range(len(padded) - 2):
+            gram = '3:' + padded[i:i + 3]
+            counts[gram] = counts.get(gram, 0) + TRIGRAM_WEIGHT * tf
+    # Sublinear tf so repeated boilerplate does not dominate a chunk
+    return {feature: 1 + math.log(count) if count >= 1 else count for feature, count in counts.items()}
+
+
+def embed(term_freqs: Dict[str, int], dim: int = DENSE_DIM):
+    """Embed a term -> frequency mapping as an L2-normalized float32 vector"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(term_freqs).items():
+        # crc32 is stable across processes, unlike hash()
+        h = zlib.crc32(feature.encode('utf-8'))
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def top_k(matrix, query_vector, k: int, exclude: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+    """Get the k best (row, score) pairs by cosine similarity, best first"""
+    rows = matrix.shape[0]
+    if rows == 0 or k <= 0:
+        return []
+
+    scores = matrix @ query_vector
+    if exclude:
+        scores[list(exclude)] = -np.inf
+
+    k = min(k, rows)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates])]
+    return [(int(row), float(scores[row])) for row in candidates if scores[row] > 0]
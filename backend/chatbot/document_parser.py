@@ -0,0 +1,111 @@
+"""
+Out-of-process text extraction for uploaded documents.
+
+PyPDF2 and python-pptx are pure Python and CPU-bound, so parsing a large
+upload on the event loop (or in a thread, holding the GIL) stalls chat for
+every other user. Parsing runs in a small process pool instead. The
+document is split into page ranges that are extracted in separate tasks and
+yielded back in order, so the caller can chunk and index page by page and
+the full document text is never held in memory.
+"""
+import os
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, List
+import PyPDF2
+from pptx import Presentation
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.environ.get('KB_PARSE_WORKERS', '2'))
+PAGES_PER_TASK = int(os.environ.get('KB_PARSE_PAGES_PER_TASK', '8'))
+
+
+# ----- worker side, runs inside the pool -----
+
+def _page_count(path: str, file_type: str) -> int:
+    if file_type == "pdf":
+        return len(PyPDF2.PdfReader(path).pages)
+    return len(Presentation(path).slides)
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _extract_pages(path: str, file_type: str, start: int, end: int) -> List[str]:
+    if file_type == "pdf":
+        reader = PyPDF2.PdfReader(path)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+    slides = Presentation(path).slides
+    return [
+        "\n".join(shape.text for shape in slides[i].shapes if hasattr(shape, "text"))
+        for i in range(start, end)
+    ]
+
+
+# ----- event loop side -----
+
+class DocumentParser:
+    def __init__(self, workers: int = PARSE_WORKERS, pages_per_task: int = PAGES_PER_TASK):
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process has live threads (Motor, crawler, to_thread workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def iter_pages(self, path: str, file_type: str) -> AsyncIterator[str]:
+        """Yield the text of each page (or slide) of a pdf/pptx/txt file, in order"""
+        if file_type == "txt":
+            # Nothing to parse - read it off the event loop as a single page
+            yield await asyncio.to_thread(_read_text, path)
+            return
+
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        in_flight = deque()
+
+        try:
+            count = await loop.run_in_executor(pool, _page_count, path, file_type)
+
+            for start in range(0, count, self.pages_per_task):
+                end = min(start + self.pages_per_task, count)
+                in_flight.append(loop.run_in_executor(pool, _extract_pages, path, file_type, start, end))
+
+                # One batch per worker in flight bounds memory to a few batches of pages
+                if len(in_flight) >= self.workers:
+                    for page in await in_flight.popleft():
+                        yield page
+
+            while in_flight:
+                for page in await in_flight.popleft():
+                    yield page
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a hostile file) - start a fresh pool next time
+            logger.error("Document parser pool crashed, restarting it")
+            self._executor = None
+            raise
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+document_parser = DocumentParser()
@@ -1,14 +1,30 @@
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from .knowledge_base import knowledge_base
+from .context_assembler import context_assembler
+from .answer_matcher import ApprovedAnswerMatcher
+from . import cache_versions
+from .usage_counters import usage_counters
+from .response_cache import response_cache
+from .llm_client import llm_client
+from .llm_guard import llm_guard
+from .model_router import Route, model_router
+from .extractive_answerer import extractive_answerer
+from .admission import AdmissionRejected, admission
+from .turn_metrics import count_db_op
+from .conversation_memory import build_memory
+from .conversation_context import conversation_context_builder
 import re
 from motor.motor_asyncio import AsyncIOMotorClient
-from difflib import SequenceMatcher
 
 logger = logging.getLogger(__name__)
 
+# "auto", "llm" or "extractive"; the admin setting overrides this default
+DEFAULT_ANSWER_MODE = os.environ.get('CHATBOT_ANSWER_MODE', 'auto')
+
 # Database connection for approved answers
 _mongo_client = None
 _db = None
@@ -35,114 +51,118 @@ class EnhancedAIService:
     """
     
     def __init__(self):
-        self.api_key = None
-        self.approved_answers_cache = None
-        self.cache_timestamp = None
+        # Approved answers, kept in sync through the cache version counter
+        self.approved_matcher = ApprovedAnswerMatcher()
+        self._approved_lock = asyncio.Lock()
+        self._approved_loaded = False
+        self._approved_version = 0
+        self._approved_local_version = 0
+        self._approved_checked_at = 0.0
+        self._answer_mode = DEFAULT_ANSWER_MODE
+        self._answer_mode_checked_at = 0.0
         logger.info("Enhanced AI Service initialized")
     
-    async def _get_approved_answers(self) -> List[Dict]:
-        """Get approved answers from database with caching"""
-        import time
-        current_time = time.time()
-        
-        # Cache for 5 minutes
-        if self.approved_answers_cache is not None and self.cache_timestamp:
-            if current_time - self.cache_timestamp < 300:  # 5 minutes
-                return self.approved_answers_cache
+    async def _get_approved_matcher(self) -> ApprovedAnswerMatcher:
+        """Get the approved-answer matcher, syncing it first when it may be stale"""
+        if self._approved_loaded and not self._approved_sync_due():
+            return self.approved_matcher
+        
+        # Single-flight: while one request syncs, others keep using the current matcher
+        if self._approved_lock.locked() and self._approved_loaded:
+            return self.approved_matcher
+        
+        async with self._approved_lock:
+            if not self._approved_loaded or self._approved_sync_due():
+                await self._sync_approved_answers()
+        return self.approved_matcher
+    
+    def _approved_sync_due(self) -> bool:
+        if cache_versions.local_version(cache_versions.APPROVED_ANSWERS) != self._approved_local_version:
+            return True
+        return time.time() - self._approved_checked_at >= cache_versions.POLL_INTERVAL
+    
+    async def _sync_approved_answers(self):
+        """Patch the matcher with answers changed since the last sync, or reload it"""
+        name = cache_versions.APPROVED_ANSWERS
+        # Read before querying, so a bump that lands mid-sync triggers another sync
+        local_version = cache_versions.local_version(name)
+        projection = {"_id": 0, "id": 1, "question_pattern": 1, "approved_answer": 1, "context_tags": 1, "is_active": 1}
         
         try:
             db = get_db()
-            answers = await db.approved_answers.find(
-                {"is_active": True},
-                {"_id": 0, "id": 1, "question_pattern": 1, "approved_answer": 1, "context_tags": 1}
-            ).to_list(500)
+            state = await cache_versions.get_version_state(db, name)
+            count_db_op()
+            version = state.get("version", 0)
+            
+            changed = None
+            # A local bump that never reached Mongo leaves the counter unchanged - reload then
+            local_only = local_version != self._approved_local_version and version == self._approved_version
+            if self._approved_loaded and version >= self._approved_version and not local_only:
+                changed = cache_versions.changed_since(state, self._approved_version)
             
-            self.approved_answers_cache = answers
-            self.cache_timestamp = current_time
-            return answers
+            if changed is None:
+                answers = await db.approved_answers.find({"is_active": True}, projection).to_list(None)
+                count_db_op()
+                # Building the index is CPU work - keep it off the event loop
+                self.approved_matcher = await asyncio.to_thread(ApprovedAnswerMatcher, answers)
+                logger.info(f"Loaded {len(answers)} approved answers (version {version})")
+            elif changed:
+                docs = await db.approved_answers.find({"id": {"$in": changed}}, projection).to_list(None)
+                count_db_op()
+                found = {doc["id"]: doc for doc in docs}
+                for answer_id in changed:
+                    doc = found.get(answer_id)
+                    if doc and doc.get("is_active", True):
+                        self.approved_matcher.upsert(doc)
+                    else:
+                        self.approved_matcher.remove(answer_id)
+                logger.info(f"Patched {len(changed)} approved answers (version {version})")
+            
+            self._approved_version = version
+            self._approved_local_version = local_version
+            self._approved_loaded = True
         except Exception as e:
             logger.error(f"Error fetching approved answers: {e}")
-            return []
+        finally:
+            # Failures also wait for the next poll instead of hitting Mongo on every message
+            self._approved_checked_at = time.time()
     
     async def _find_matching_approved_answer(self, user_message: str) -> Optional[Dict]:
         """Find a matching approved answer for the user's question"""
-        approved_answers = await self._get_approved_answers()
+        matcher = await self._get_approved_matcher()
         
-        if not approved_answers:
+        match = matcher.match(user_message)
+        if not match:
             return None
+        best_match, best_score = match
         
-        user_lower = user_message.lower().strip()
-        best_match = None
-        best_score = 0.0
-        
-        # Minimum similarity threshold for a match
-        SIMILARITY_THRESHOLD = 0.65
-        
-        for answer in approved_answers:
-            pattern = answer.get("question_pattern", "").lower().strip()
-            
-            # Direct substring match (highest priority)
-            if pattern in user_lower or user_lower in pattern:
-                score = 0.95
-            else:
-                # Fuzzy matching using SequenceMatcher
-                score = SequenceMatcher(None, user_lower, pattern).ratio()
-                
-                # Also check word overlap for better matching
-                user_words = set(user_lower.split())
-                pattern_words = set(pattern.split())
-                if pattern_words:
-                    word_overlap = len(user_words & pattern_words) / len(pattern_words)
-                    # Combine fuzzy score with word overlap
-                    score = (score + word_overlap) / 2
-            
-            if score > best_score and score >= SIMILARITY_THRESHOLD:
-                best_score = score
-                best_match = answer
-        
-        if best_match:
-            logger.info(f"Found approved answer match (score: {best_score:.2f}) for: {user_message[:50]}...")
-            # Track usage
-            try:
-                db = get_db()
-                await db.approved_answers.update_one(
-                    {"id": best_match["id"]},
-                    {"$inc": {"usage_count": 1}}
-                )
-            except Exception as e:
-                logger.warning(f"Failed to update usage count: {e}")
+        logger.info(f"Found approved answer match (score: {best_score:.2f}) for: {user_message[:50]}...")
+        # Track usage - buffered and flushed in bulk, off the response path
+        usage_counters.increment(best_match["id"])
         
         return best_match
     
-    def _get_api_key(self):
-        if not self.api_key:
-            from dotenv import load_dotenv
-            load_dotenv()
-            self.api_key = os.environ.get('EMERGENT_LLM_KEY')
-            if not self.api_key:
-                raise ValueError("EMERGENT_LLM_KEY not found in environment")
-        return self.api_key
-    
-    def create_chat(self, session_id: str, system_message: str) -> LlmChat:
-        """Create a new chat instance"""
-        api_key = self._get_api_key()
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=session_id,
-            system_message=system_message
-        )
-        chat.with_model("openai", "gpt-4o")
-        return chat
-    
     async def generate_response(
         self,
         session_id: str,
         user_message: str,
         user_info: Dict,
         conversation_history: List[Dict],
-        show_closure: bool = False
+        show_closure: bool = False,
+        token_sink: Optional[Callable[[str], None]] = None,
+        total_messages: Optional[int] = None,
+        conversation_memory: Optional[Dict] = None,
+        conversation_summary: Optional[Dict] = None
     ) -> Dict:
-        """Generate intelligent AI response with context awareness"""
+        """
+        Generate intelligent AI response with context awareness.
+        With a token_sink, LLM output is also passed to it piece by piece as it arrives.
+        conversation_history may be just the latest messages; total_messages is
+        the full conversation length, used for its depth. conversation_memory is
+        the session's stored memory; without it, it is derived from the history.
+        conversation_summary is the session's rolling summary of older turns.
+        """
+        depth = total_messages if total_messages is not None else len(conversation_history)
         try:
             # If closure requested, show it
             if show_closure:
@@ -152,14 +172,19 @@ class EnhancedAIService:
             context_analysis = self._analyze_conversation_context(
                 user_message, 
                 conversation_history,
-                user_info
+                user_info,
+                depth
             )
             
-            # Extract conversation memory (key points mentioned)
-            conversation_memory = self._extract_conversation_memory(conversation_history)
+            # Conversation memory (key points mentioned)
+            if conversation_memory is None:
+                conversation_memory = build_memory(conversation_history)
+            
+            # Recent turns and the summary of older ones, within a fixed token budget
+            conversation_context = conversation_context_builder.render(conversation_history, conversation_summary)
             
             # Check for greeting - respond warmly
-            if self._is_greeting(user_message) and len(conversation_history) == 0:
+            if self._is_greeting(user_message) and depth == 0:
                 return self._generate_greeting_response(user_info)
             
             # Check if user is expressing frustration
@@ -220,17 +245,15 @@ class EnhancedAIService:
             # If it's a business query, ALWAYS answer first (unless explicit contact request)
             if is_business_query and not explicit_contact_request:
                 # Answer the query first
-                context_results = knowledge_base.query(user_message)
-                context = "\n".join(context_results) if context_results else ""
-                
-                response = await self._generate_contextual_response(
+                response, context = await self._generate_kb_response(
                     session_id,
                     user_message,
-                    context,
                     conversation_history,
                     context_analysis,
                     conversation_memory,
-                    user_info
+                    user_info,
+                    token_sink,
+                    conversation_context
                 )
                 
                 # Only ask for info if we've had enough exchanges (at least 3)
@@ -320,17 +343,15 @@ class EnhancedAIService:
             
             # DEFAULT BEHAVIOR: Always generate a helpful response
             # This is the catch-all - if we reach here, just be helpful
-            context_results = knowledge_base.query(user_message)
-            context = "\n".join(context_results) if context_results else ""
-            
-            response = await self._generate_contextual_response(
+            response, context = await self._generate_kb_response(
                 session_id,
                 user_message,
-                context,
                 conversation_history,
                 context_analysis,
                 conversation_memory,
-                user_info
+                user_info,
+                token_sink,
+                conversation_context
             )
             
             # Analyze if question was answered
@@ -346,6 +367,8 @@ class EnhancedAIService:
                 "sentiment": context_analysis['sentiment']
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error in enhanced AI service: {e}")
             return {
@@ -423,6 +446,22 @@ What works best for you?"""
     ) -> Dict:
         """Generate an empathetic response when user is frustrated"""
         
+        # Shed like any other turn - a frustrated visitor should not also wait on a full queue
+        if await self._shed_reason():
+            return {
+                "response": """I'm really sorry this hasn't been helpful so far - that's on us, not you.
+
+Let me get you to a person who can sort it out directly:
+📧 **Email us:** ai.zentiam@gmail.com
+📞 **Call us:** +91 80889-83706
+📝 **Or** leave your details and our team will reach out within 24 hours""",
+                "needs_info": False,
+                "is_answered": False,
+                "info_complete": False,
+                "intent": "empathy",
+                "sentiment": "frustrated"
+            }
+        
         system_message = """You are a warm, empathetic AI assistant for Zentiam. The user seems frustrated or confused.
 
 Your goal is to:
@@ -439,8 +478,11 @@ DO NOT:
 - Use corporate speak
 - Be overly formal"""
 
-        chat = self.create_chat(session_id + "_empathy", system_message)
-        response = await chat.send_message(UserMessage(text=f"User says: {user_message}\n\nRespond with empathy and try to help differently."))
+        response = await self._send_message(
+            session_id + "_empathy",
+            system_message,
+            f"User says: {user_message}\n\nRespond with empathy and try to help differently."
+        )
         
         return {
             "response": response,
@@ -451,69 +493,20 @@ DO NOT:
             "sentiment": "frustrated"
         }
     
-    def _extract_conversation_memory(self, history: List[Dict]) -> Dict:
-        """Extract key information mentioned in conversation"""
-        memory = {
-            "user_industry": None,
-            "user_company_size": None,
-            "user_challenges": [],
-            "topics_discussed": [],
-            "questions_asked": [],
-            "user_interests": []
-        }
-        
-        if not history:
-            return memory
-        
-        for msg in history:
-            if msg.get('sender') == 'user':
-                text = msg.get('message', '').lower()
-                
-                # Detect industry mentions
-                industries = {
-                    'healthcare': ['healthcare', 'medical', 'hospital', 'clinic', 'patient'],
-                    'finance': ['finance', 'banking', 'financial', 'investment', 'trading'],
-                    'retail': ['retail', 'ecommerce', 'e-commerce', 'store', 'shopping'],
-                    'manufacturing': ['manufacturing', 'factory', 'production', 'assembly'],
-                    'logistics': ['logistics', 'shipping', 'supply chain', 'warehouse'],
-                    'technology': ['tech', 'software', 'saas', 'startup', 'app']
-                }
-                for industry, keywords in industries.items():
-                    if any(kw in text for kw in keywords):
-                        memory['user_industry'] = industry
-                        break
-                
-                # Detect challenges
-                challenge_keywords = ['struggling', 'challenge', 'problem', 'issue', 'difficult', 'pain point', 'bottleneck']
-                if any(kw in text for kw in challenge_keywords):
-                    memory['user_challenges'].append(text[:100])
-                
-                # Detect topics of interest
-                if 'pricing' in text or 'cost' in text:
-                    memory['topics_discussed'].append('pricing')
-                if 'automation' in text:
-                    memory['topics_discussed'].append('automation')
-                if 'chatbot' in text or 'chat bot' in text:
-                    memory['topics_discussed'].append('chatbots')
-                if 'data' in text and ('analysis' in text or 'analytics' in text):
-                    memory['topics_discussed'].append('data analytics')
-        
-        # Remove duplicates
-        memory['topics_discussed'] = list(set(memory['topics_discussed']))
-        
-        return memory
-    
     def _analyze_conversation_context(
         self, 
         current_message: str, 
         history: List[Dict],
-        user_info: Dict
+        user_info: Dict,
+        depth: Optional[int] = None
     ) -> Dict:
         """Analyze conversation to determine intent, sentiment, and needs"""
         message_lower = current_message.lower()
+        if depth is None:
+            depth = len(history)
         
         # Detect intent
-        intent = self._detect_intent(current_message, history)
+        intent = self._detect_intent(current_message, depth)
         
         # Detect sentiment
         sentiment = self._detect_sentiment(current_message)
@@ -528,7 +521,7 @@ DO NOT:
         
         # Determine if we should collect contact info
         needs_contact_collection = (
-            is_frustrated and len(history) >= 2
+            is_frustrated and depth >= 2
         )
         
         return {
@@ -536,16 +529,16 @@ DO NOT:
             'sentiment': sentiment,
             'is_frustrated': is_frustrated,
             'needs_contact_collection': needs_contact_collection,
-            'conversation_depth': len(history)
+            'conversation_depth': depth
         }
     
-    def _detect_intent(self, message: str, history: List[Dict]) -> str:
+    def _detect_intent(self, message: str, depth: int) -> str:
         """Detect user intent"""
         message_lower = message.lower()
         
         # Exploring signals
         exploring_keywords = ['what is', 'tell me about', 'how does', 'what are', 'explain', 'can you tell me']
-        if any(kw in message_lower for kw in exploring_keywords) and len(history) < 3:
+        if any(kw in message_lower for kw in exploring_keywords) and depth < 3:
             return 'exploring'
         
         # Specific problem signals
@@ -567,7 +560,7 @@ DO NOT:
             return 'ready_to_convert'
         
         # Default based on conversation depth
-        if len(history) >= 4:
+        if depth >= 4:
             return 'engaged'
         
         return 'exploring'
@@ -595,6 +588,114 @@ DO NOT:
         
         return 'neutral'
     
+    async def _generate_kb_response(
+        self,
+        session_id: str,
+        user_message: str,
+        history: List[Dict],
+        context_analysis: Dict,
+        conversation_memory: Dict,
+        user_info: Dict,
+        token_sink: Optional[Callable[[str], None]] = None,
+        conversation_context: str = ""
+    ) -> Tuple[str, str]:
+        """Answer from the knowledge base, reusing the reply to an identical earlier question"""
+        # Name, industry, topics and earlier turns make the prompt personal - never share those replies
+        personalized = bool(
+            user_info.get('name') or
+            conversation_memory.get('user_industry') or
+            conversation_memory.get('topics_discussed') or
+            conversation_context
+        )
+        
+        cache_key = None
+        if personalized:
+            response_cache.record_bypass()
+        else:
+            cache_key = response_cache.make_key(
+                user_message,
+                context_analysis['intent'],
+                context_analysis['sentiment'],
+                knowledge_base.version
+            )
+            cached = response_cache.get(cache_key)
+            if cached:
+                return cached
+        
+        chunks = context_assembler.select(user_message)
+        context = "\n\n".join(chunks)
+        
+        # Load shedding: a grounded extractive answer beats a timeout
+        shed_reason = await self._shed_reason()
+        if shed_reason:
+            extractive = extractive_answerer.answer(user_message, chunks, shed_reason)
+            if extractive:
+                return extractive, context
+            if shed_reason != "saturated":
+                # Forced extractive mode never calls the LLM, and without a key the call cannot succeed
+                return extractive_answerer.no_answer_reply(shed_reason), context
+        
+        try:
+            response = await self._generate_contextual_response(
+                session_id,
+                user_message,
+                context,
+                history,
+                context_analysis,
+                conversation_memory,
+                user_info,
+                token_sink,
+                conversation_context
+            )
+        except AdmissionRejected as e:
+            # In "llm" mode the client is asked to retry instead
+            extractive = None
+            if await self._get_answer_mode() != "llm":
+                extractive = extractive_answerer.answer(user_message, chunks, e.reason)
+            if extractive is None:
+                raise
+            return extractive, context
+        except Exception as e:
+            # "llm" mode reports the failure rather than answer without the LLM
+            extractive = None
+            if await self._get_answer_mode() != "llm":
+                extractive = extractive_answerer.answer(user_message, chunks, "llm_error")
+            if extractive is None:
+                raise
+            logger.warning(f"LLM call failed, serving extractive answer: {e}")
+            return extractive, context
+        
+        if cache_key is not None:
+            response_cache.put(cache_key, (response, context))
+        return response, context
+    
+    async def _get_answer_mode(self) -> str:
+        """Answer mode from the admin settings, re-read every few seconds"""
+        now = time.monotonic()
+        if now - self._answer_mode_checked_at < cache_versions.POLL_INTERVAL:
+            return self._answer_mode
+        
+        self._answer_mode_checked_at = now
+        try:
+            settings = await get_db().settings.find_one({"type": "system"}, {"chatbot_answer_mode": 1})
+            count_db_op()
+            self._answer_mode = (settings or {}).get("chatbot_answer_mode") or DEFAULT_ANSWER_MODE
+        except Exception as e:
+            logger.warning(f"Could not read chatbot answer mode: {e}")
+        return self._answer_mode
+    
+    async def _shed_reason(self) -> Optional[str]:
+        """Why this turn should skip the LLM, or None to call it"""
+        mode = await self._get_answer_mode()
+        if mode == "extractive":
+            return "forced"
+        if not llm_client.has_api_key():
+            return "no_api_key"
+        # Turns run on the routed tier models, not necessarily the guard's own primary and fallback
+        if mode == "auto" and (llm_guard.is_degraded(model_router.models()) or admission.is_full()):
+            return "saturated"
+        return None
+    
     async def _generate_contextual_response(
         self,
         session_id: str,
@@ -603,7 +704,9 @@ DO NOT:
         history: List[Dict],
         context_analysis: Dict,
         conversation_memory: Dict,
-        user_info: Dict
+        user_info: Dict,
+        token_sink: Optional[Callable[[str], None]] = None,
+        conversation_context: str = ""
     ) -> str:
         """Generate response based on context and conversation state"""
         
@@ -640,6 +743,9 @@ DO NOT:
 {industry_context}
 {topics_context}
 
+**CONVERSATION SO FAR:**
+{conversation_context if conversation_context else "This is the start of the conversation."}
+
 **KNOWLEDGE BASE INFO:**
 {context if context else "No specific info found - use your general knowledge about AI consulting."}
 
@@ -687,11 +793,49 @@ What's your current support setup like? Are you mainly dealing with high volume,
 
 Remember: Be helpful first. Sales happen naturally when you genuinely help people."""
 
-        chat = self.create_chat(session_id, system_message)
-        response = await chat.send_message(UserMessage(text=user_message))
+        route = model_router.route(user_message, context, context_analysis)
+        response = await self._send_message(session_id, system_message, user_message, token_sink, route)
         
         return response
     
+    async def _send_message(
+        self,
+        session_id: str,
+        system_message: str,
+        text: str,
+        token_sink: Optional[Callable[[str], None]] = None,
+        route: Optional[Route] = None
+    ) -> str:
+        """
+        Send a message over the shared LLM transport under the latency guard,
+        streaming the reply into token_sink when one is given
+        """
+        answered_by = []
+        
+        async def send(model: str, sink: Optional[Callable[[str], None]]) -> str:
+            reply = await llm_client.complete(system_message, text, model=model, token_sink=sink)
+            answered_by.append(model)
+            return reply
+        
+        async with admission.slot():
+            if route is None:
+                return await llm_guard.call(send, token_sink)
+            
+            model = model_router.model_for(route)
+            started = time.monotonic()
+            reply = None
+            try:
+                reply = await llm_guard.call(send, token_sink, model=model, fallback=model_router.fallback_for(route))
+                return reply
+            finally:
+                model_router.record(
+                    route,
+                    answered_by[0] if answered_by else model,
+                    time.monotonic() - started,
+                    system_message + text,
+                    reply
+                )
+    
     def _generate_contact_request(self, context: Dict, user_info: Dict) -> Dict:
         """Generate smart contact collection request based on context"""
         if context['is_frustrated']:
@@ -0,0 +1,155 @@
+"""
+Extractive answers from the knowledge base, without an LLM.
+
+Used when the LLM cannot serve a turn - no key, every model's breaker
+open, the admission queue full, or an error - or when forced by the
+chatbot answer mode setting. The reply is made of the knowledge base
+sentences that best match the question: each sentence is scored on the
+question terms it contains, weighted by how rare they are among the
+candidates, with a bonus for consecutive question terms and for coming
+from a higher-ranked chunk.
+"""
+import os
+import re
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+from .text_utils import content_words
+
+logger = logging.getLogger(__name__)
+
+MAX_SENTENCES = int(os.environ.get('EXTRACTIVE_MAX_SENTENCES', '3'))
+MAX_CHARS = int(os.environ.get('EXTRACTIVE_MAX_CHARS', '600'))
+# Share of the question's term weight a sentence must cover to be used
+MIN_COVERAGE = float(os.environ.get('EXTRACTIVE_MIN_COVERAGE', '0.3'))
+
+MIN_SENTENCE_WORDS = 5
+MAX_SENTENCE_WORDS = 60
+
+CLOSING = "If you'd like more detail, our team is happy to walk you through it - just ask to speak with someone."
+
+# When the knowledge base has nothing on the question and the LLM is not to be called
+NO_ANSWER_REPLY = """I don't have that in my sources, and I'd rather not guess. Let me connect you with our team - they can answer it directly:
+
+📧 **Email us:** ai.zentiam@gmail.com
+📞 **Call us:** +91 80889-83706
+📝 **Or** leave your details and we'll reach out within 24 hours"""
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+
+def _stem(word: str) -> str:
+    """Fold simple plurals, so 'service' matches 'services'"""
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> List[str]:
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split chunk text into whole sentences, dropping fragments cut at chunk edges"""
+    sentences = []
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        sentence = sentence.strip()
+        words = sentence.split()
+        if not (MIN_SENTENCE_WORDS <= len(words) <= MAX_SENTENCE_WORDS):
+            continue
+        if not sentence[0].isupper() and not sentence[0].isdigit():
+            continue  # starts mid-sentence
+        if sentence[-1] not in '.!?':
+            continue  # runs into the next chunk
+        sentences.append(sentence)
+    return sentences
+
+
+class ExtractiveAnswerer:
+    def __init__(self, max_sentences: int = MAX_SENTENCES, max_chars: int = MAX_CHARS):
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.served: Dict[str, int] = {}  # reason -> replies served
+        self.no_answer = 0
+        self.handed_off: Dict[str, int] = {}  # reason -> fixed no-answer replies served
+
+    def select(self, question: str, chunks: List[str]) -> List[str]:
+        """Best matching sentences from the ranked chunks, in reading order"""
+        terms = {_stem(word) for word in content_words(question)}
+        if not terms:
+            return []
+        question_words = _words(question)
+        bigrams = {pair for pair in zip(question_words, question_words[1:]) if set(pair) <= terms}
+
+        candidates: List[Tuple[int, int, str, set, List[str]]] = []
+        for rank, chunk in enumerate(chunks):
+            for position, sentence in enumerate(split_sentences(chunk)):
+                words = _words(sentence)
+                candidates.append((rank, position, sentence, set(words), words))
+        if not candidates:
+            return []
+
+        # Rarer question terms say more about whether a sentence is on topic
+        total = len(candidates)
+        idf = {
+            term: math.log(1 + total / (1 + sum(1 for c in candidates if term in c[3])))
+            for term in terms
+        }
+        question_weight = sum(idf.values())
+
+        scored = []
+        for rank, position, sentence, word_set, words in candidates:
+            matched = terms & word_set
+            if not matched:
+                continue
+            coverage = sum(idf[term] for term in matched) / question_weight
+            if coverage < MIN_COVERAGE:
+                continue
+            phrase_bonus = 0.1 * sum(1 for pair in zip(words, words[1:]) if pair in bigrams)
+            rank_bonus = 0.1 / (1 + rank)
+            # Mild length normalisation so long sentences do not win on volume alone
+            score = (coverage + phrase_bonus + rank_bonus) / math.sqrt(max(1, len(words)) / 20)
+            scored.append((score, rank, position, sentence))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        picked = []
+        seen = set()
+        used = 0
+        for score, rank, position, sentence in scored:
+            key = sentence.lower()
+            if key in seen or used + len(sentence) > self.max_chars:
+                continue
+            seen.add(key)
+            picked.append((rank, position, sentence))
+            used += len(sentence) + 1
+            if len(picked) >= self.max_sentences:
+                break
+
+        return [sentence for _, _, sentence in sorted(picked)]
+
+    def answer(self, question: str, chunks: List[str], reason: str) -> Optional[str]:
+        """Build a reply, or None when the knowledge base has nothing on the question"""
+        sentences = self.select(question, chunks)
+        if not sentences:
+            self.no_answer += 1
+            return None
+
+        self.served[reason] = self.served.get(reason, 0) + 1
+        logger.info(f"Serving extractive answer ({reason}) for: {question[:50]}...")
+        return ' '.join(sentences) + "\n\n" + CLOSING
+
+    def no_answer_reply(self, reason: str) -> str:
+        """Fixed reply pointing to the team, for when answer() found nothing and the LLM is off limits"""
+        self.handed_off[reason] = self.handed_off.get(reason, 0) + 1
+        return NO_ANSWER_REPLY
+
+    def get_stats(self) -> Dict:
+        return {
+            "served": dict(self.served),
+            "served_total": sum(self.served.values()),
+            "no_answer": self.no_answer,
+            "handed_off": dict(self.handed_off)
+        }
+
+# Global instance
+extractive_answerer = ExtractiveAnswerer()
@@ -0,0 +1,58 @@
+"""
+Exclusive lock shared by the threads of one worker and by other worker
+processes on the same host, for files several workers write.
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX - only the threads of this process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        # flock() does not exclude threads sharing one descriptor, so they queue here first
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._unavailable = fcntl is None
+
+    @contextmanager
+    def hold(self, blocking: bool = True) -> Iterator[bool]:
+        """Yields True while the lock is held, or False if blocking is off and it is taken"""
+        if not self._thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            acquired = self._lock_file(blocking)
+            try:
+                yield acquired
+            finally:
+                if acquired and not self._unavailable:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+    def _lock_file(self, blocking: bool) -> bool:
+        if self._unavailable:
+            return True
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError as e:
+                # The files it guards are not writable either; keep the thread lock
+                logger.warning(f"Could not open lock file {self.path}: {e}")
+                self._unavailable = True
+                return True
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
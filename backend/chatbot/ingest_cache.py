@@ -0,0 +1,107 @@
+"""
+Content-addressed cache of parsed upload chunks.
+
+Parsed chunks are stored per file sha256 as JSON lines (one line per page),
+so re-uploading a file that was seen before skips parsing altogether. A
+small manifest maps each document id to the hash of the file currently
+indexed under it, which turns an identical re-upload into a no-op.
+"""
+import os
+import json
+import logging
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_FILES = int(os.environ.get('KB_INGEST_CACHE_FILES', '50'))
+
+
+class ChunkWriter:
+    """Writes a file's chunks page by page, published only on commit"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Unique per writer - two uploads of one file may be parsed at once
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        self._file = os.fdopen(fd, 'w', encoding='utf-8')
+
+    def write(self, chunks: List[str]):
+        self._file.write(json.dumps(chunks) + "\n")
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+class IngestCache:
+    def __init__(self, cache_dir: str, max_files: int = MAX_CACHED_FILES):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, "documents.json")
+        self.max_files = max_files
+
+    def _chunks_path(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{file_hash}.jsonl")
+
+    # ----- document manifest -----
+
+    def _load_manifest(self) -> Dict[str, str]:
+        # Read on every call - other workers may have ingested since
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable ingest manifest: {e}")
+            return {}
+
+    def document_hash(self, doc_id: str) -> Optional[str]:
+        """Get the hash of the file currently indexed as doc_id"""
+        return self._load_manifest().get(doc_id)
+
+    def set_document_hash(self, doc_id: str, file_hash: str):
+        manifest = self._load_manifest()
+        manifest[doc_id] = file_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ----- parsed chunks -----
+
+    def has_chunks(self, file_hash: str) -> bool:
+        return os.path.exists(self._chunks_path(file_hash))
+
+    def read_chunks(self, file_hash: str) -> Iterator[List[str]]:
+        """Yield the cached chunks of a file, one list per page"""
+        path = self._chunks_path(file_hash)
+        # Hits count as use for pruning
+        os.utime(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def writer(self, file_hash: str) -> ChunkWriter:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return ChunkWriter(self._chunks_path(file_hash))
+
+    def prune(self):
+        """Drop the least recently used chunk files beyond the size limit"""
+        try:
+            entries = [
+                os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir) if name.endswith(".jsonl")
+            ]
+            entries.sort(key=os.path.getmtime, reverse=True)
+            for path in entries[self.max_files:]:
+                os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Error pruning ingest cache: {e}")
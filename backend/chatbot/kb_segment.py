@@ -0,0 +1,255 @@
+"""
+Immutable on-disk segment for the knowledge store.
+
+Workers mmap a segment and query it in place instead of deserializing the
+whole corpus. Layout (little-endian):
+
+    header    magic, doc/term counts, total token length, section offsets
+    terms     sorted term dictionary: (term offset, term length, postings offset, postings count)
+    postings  uint32 pairs of (doc number, term frequency), doc numbers ascending
+    docs      per document: (blob offset, id length, text length, metadata length, token length)
+    ids       doc numbers sorted by doc id, for id lookups and prefix scans
+    lengths   uint32 token length per doc, for BM25 length normalization
+    blob      utf-8 doc ids, chunk texts and JSON metadata
+    vectors   optional float32 matrix (one row per doc) for dense retrieval
+
+Only the header is parsed on open; everything else is read from the mapping
+on demand, so chunk text is materialized just for the hits a query returns.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b'ZKBSEG02'
+MAGIC_V1 = b'ZKBSEG01'
+
+# magic, n_docs, n_terms, total_length, then section offsets:
+# terms, term blob, postings, docs, ids, lengths, blob, vectors; then vector dimension
+HEADER = struct.Struct('<8sIIQQQQQQQQQI')
+# Segments written before dense vectors were added
+HEADER_V1 = struct.Struct('<8sIIQQQQQQQ')
+TERM = struct.Struct('<QIQI')
+DOC = struct.Struct('<QIIII')
+UINT32 = struct.Struct('<I')
+
+
+def write_segment(
+    path: str,
+    documents: List[Tuple[str, str, Dict, int]],
+    postings: Dict[str, List[Tuple[int, int]]],
+    vectors: bytes = b'',
+    dim: int = 0
+):
+    """
+    Write a segment file.
+
+    documents: (doc id, text, metadata, token length), numbered by position
+    postings: term -> [(doc number, term frequency)] with ascending doc numbers
+    vectors: optional row-major float32 matrix of len(documents) x dim
+    """
+    blob = bytearray()
+    doc_entries = bytearray()
+    total_length = 0
+    encoded_ids = []
+
+    for doc_id, text, metadata, length in documents:
+        id_bytes = doc_id.encode('utf-8')
+        text_bytes = text.encode('utf-8')
+        meta_bytes = json.dumps(metadata or {}).encode('utf-8')
+        doc_entries += DOC.pack(len(blob), len(id_bytes), len(text_bytes), len(meta_bytes), length)
+        blob += id_bytes + text_bytes + meta_bytes
+        encoded_ids.append(id_bytes)
+        total_length += length
+
+    # Terms are compared as utf-8 bytes when looking them up
+    terms = sorted(postings, key=lambda t: t.encode('utf-8'))
+    term_entries = bytearray()
+    term_blob = bytearray()
+    posting_bytes = bytearray()
+    for term in terms:
+        term_bytes = term.encode('utf-8')
+        plist = postings[term]
+        flat = [value for pair in plist for value in pair]
+        term_entries += TERM.pack(len(term_blob), len(term_bytes), len(posting_bytes), len(plist))
+        term_blob += term_bytes
+        posting_bytes += struct.pack(f'<{len(flat)}I', *flat)
+
+    id_order = sorted(range(len(documents)), key=lambda n: encoded_ids[n])
+    id_bytes = struct.pack(f'<{len(id_order)}I', *id_order)
+    length_bytes = struct.pack(f'<{len(documents)}I', *(doc[3] for doc in documents))
+
+    terms_off = HEADER.size
+    term_blob_off = terms_off + len(term_entries)
+    postings_off = term_blob_off + len(term_blob)
+    docs_off = postings_off + len(posting_bytes)
+    ids_off = docs_off + len(doc_entries)
+    lengths_off = ids_off + len(id_bytes)
+    blob_off = lengths_off + len(length_bytes)
+    # Keep the float32 matrix 4-byte aligned so it can be viewed without copying
+    padding = b'\0' * (-(blob_off + len(blob)) % 4)
+    vectors_off = blob_off + len(blob) + len(padding) if vectors else 0
+
+    header = HEADER.pack(
+        MAGIC, len(documents), len(terms), total_length,
+        terms_off, term_blob_off, postings_off, docs_off, ids_off, lengths_off, blob_off,
+        vectors_off, dim if vectors else 0
+    )
+
+    sections = (header, term_entries, term_blob, posting_bytes, doc_entries, id_bytes, length_bytes, blob, padding, vectors)
+    with open(path, 'wb') as f:
+        for section in sections:
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _lower_bound(count: int, key_at: Callable[[int], bytes], key: bytes) -> int:
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key_at(mid) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class Segment:
+    """Read-only, memory-mapped view of a segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        magic = self._mm[:len(MAGIC)]
+        if magic == MAGIC:
+            (_, self.doc_count, self.term_count, self.total_length,
+             self._terms_off, self._term_blob_off, self._postings_off,
+             self._docs_off, self._ids_off, lengths_off, self._blob_off,
+             self._vectors_off, self.dim) = HEADER.unpack_from(self._mm, 0)
+            # Hot in every BM25 query - 4 bytes per doc is cheap to keep resident
+            self.lengths = array('I', self._mm[lengths_off:lengths_off + 4 * self.doc_count])
+            if sys.byteorder != 'little':
+                self.lengths.byteswap()
+        elif magic == MAGIC_V1:
+            (_, self.doc_count, self.term_count, self.total_length,
+             self._terms_off, self._term_blob_off, self._postings_off,
+             self._docs_off, self._ids_off, self._blob_off) = HEADER_V1.unpack_from(self._mm, 0)
+            self._vectors_off, self.dim = 0, 0
+            self.lengths = array('I', (self._doc_entry(n)[4] for n in range(self.doc_count)))
+        else:
+            self.close()
+            raise ValueError(f"Not a knowledge store segment: {path}")
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            # A vector view is still referenced somewhere - the mapping goes away with it
+            pass
+        self._file.close()
+
+    def vectors(self) -> Optional[memoryview]:
+        """Zero-copy view of the float32 vector section, or None"""
+        if not self.dim:
+            return None
+        size = self.doc_count * self.dim * 4
+        return memoryview(self._mm)[self._vectors_off:self._vectors_off + size]
+
+    # ----- term dictionary -----
+
+    def _term_entry(self, i: int) -> Tuple[int, int, int, int]:
+        return TERM.unpack_from(self._mm, self._terms_off + i * TERM.size)
+
+    def _term_at(self, i: int) -> bytes:
+        term_off, term_len, _, _ = self._term_entry(i)
+        start = self._term_blob_off + term_off
+        return self._mm[start:start + term_len]
+
+    def postings(self, term: str) -> List[Tuple[int, int]]:
+        """Get (doc number, term frequency) pairs for a term"""
+        flat = self.postings_flat(term)
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def postings_flat(self, term: str) -> Tuple[int, ...]:
+        """Get postings as a flat (doc number, tf, doc number, tf, ...) tuple"""
+        key = term.encode('utf-8')
+        i = _lower_bound(self.term_count, self._term_at, key)
+        if i == self.term_count or self._term_at(i) != key:
+            return ()
+        _, _, postings_off, count = self._term_entry(i)
+        return struct.unpack_from(f'<{2 * count}I', self._mm, self._postings_off + postings_off)
+
+    def iter_postings(self) -> Iterator[Tuple[str, List[Tuple[int, int]]]]:
+        """Iterate over every term and its postings, used when compacting"""
+        for i in range(self.term_count):
+            yield self._term_at(i).decode('utf-8'), self._postings_at(i)
+
+    def _postings_at(self, i: int) -> List[Tuple[int, int]]:
+        _, _, postings_off, count = self._term_entry(i)
+        flat = struct.unpack_from(f'<{2 * count}I', self._mm, self._postings_off + postings_off)
+        return list(zip(flat[0::2], flat[1::2]))
+
+    # ----- documents -----
+
+    def _doc_entry(self, n: int) -> Tuple[int, int, int, int, int]:
+        return DOC.unpack_from(self._mm, self._docs_off + n * DOC.size)
+
+    def length(self, n: int) -> int:
+        return self.lengths[n]
+
+    def _id_bytes(self, n: int) -> bytes:
+        blob_off, id_len, _, _, _ = self._doc_entry(n)
+        start = self._blob_off + blob_off
+        return self._mm[start:start + id_len]
+
+    def doc_id(self, n: int) -> str:
+        return self._id_bytes(n).decode('utf-8')
+
+    def text(self, n: int) -> str:
+        blob_off, id_len, text_len, _, _ = self._doc_entry(n)
+        start = self._blob_off + blob_off + id_len
+        return self._mm[start:start + text_len].decode('utf-8')
+
+    def metadata(self, n: int) -> Dict:
+        blob_off, id_len, text_len, meta_len, _ = self._doc_entry(n)
+        start = self._blob_off + blob_off + id_len + text_len
+        return json.loads(self._mm[start:start + meta_len])
+
+    # ----- id lookups -----
+
+    def _doc_at_rank(self, rank: int) -> int:
+        return UINT32.unpack_from(self._mm, self._ids_off + rank * UINT32.size)[0]
+
+    def _id_at_rank(self, rank: int) -> bytes:
+        return self._id_bytes(self._doc_at_rank(rank))
+
+    def find(self, doc_id: str) -> Optional[int]:
+        """Get the doc number for a doc id, or None"""
+        key = doc_id.encode('utf-8')
+        rank = _lower_bound(self.doc_count, self._id_at_rank, key)
+        if rank < self.doc_count and self._id_at_rank(rank) == key:
+            return self._doc_at_rank(rank)
+        return None
+
+    def ids_with_prefix(self, prefix: str) -> List[Tuple[str, int]]:
+        """Get (doc id, doc number) for every doc id starting with prefix"""
+        key = prefix.encode('utf-8')
+        rank = _lower_bound(self.doc_count, self._id_at_rank, key)
+        matches = []
+        while rank < self.doc_count:
+            id_bytes = self._id_at_rank(rank)
+            if not id_bytes.startswith(key):
+                break
+            matches.append((id_bytes.decode('utf-8'), self._doc_at_rank(rank)))
+            rank += 1
+        return matches
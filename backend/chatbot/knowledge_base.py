@@ -1,48 +1,337 @@
 import os
-from typing import List, Dict
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
 import logging
-import requests
-from bs4 import BeautifulSoup
-import PyPDF2
-import io
-from pptx import Presentation
 import json
 import hashlib
+import heapq
+import math
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from .kb_segment import Segment, write_segment
+from . import dense_index
+from .web_crawler import WebsiteCrawler
+from .document_parser import document_parser
+from .ingest_cache import IngestCache
+from .file_lock import FileLock
 
 logger = logging.getLogger(__name__)
 
 # Simple in-memory vector store for deployment compatibility
-# Uses OpenAI embeddings via Emergent LLM key instead of sentence-transformers
+# Keyword (BM25) retrieval plus offline hashed dense vectors - no embedding API calls
+
+# Version of the legacy JSON snapshot layout (bare documents dict = version 0)
+STORE_FORMAT = 2
+
+# BM25 tuning - standard defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
 
 class SimpleVectorStore:
-    """Lightweight vector store using keyword matching and TF-IDF-like scoring"""
+    """
+    Lightweight keyword store with BM25 scoring and optional dense vectors.
+
+    Compacted documents live in an mmap'd binary segment (see kb_segment);
+    changes since the last compaction live in an in-memory table backed by
+    an append-only log. Segment documents that were replaced or removed are
+    masked by tombstones until the next compaction.
+    """
     
-    def __init__(self):
-        self.documents = {}  # id -> {text, metadata, keywords}
-        self.storage_path = "/app/backend/knowledge_store.json"
-        self._load_store()
+    def __init__(self, storage_dir: str = "/app/backend", load: bool = True):
+        self.documents = {}  # recent id -> {text, metadata, keywords, term_freqs, length}
+        self.index = {}  # term -> {doc id: term frequency} (posting list) for recent documents
+        self.total_length = 0  # sum of recent document lengths, for the BM25 average
+        self.vectors = {}  # recent id -> dense vector
+        self.segment = None  # compacted documents
+        self._matrix = None  # zero-copy view of the segment's dense vectors
+        self.deleted = set()  # tombstoned segment doc numbers
+        self.deleted_length = 0
+        self.scoring = os.environ.get('KB_SCORING', 'bm25')
+        self.storage_dir = storage_dir
+        self.segment_path = os.path.join(storage_dir, "knowledge_store.seg")
+        # Legacy JSON snapshot, migrated into a segment on first load
+        self.storage_path = os.path.join(storage_dir, "knowledge_store.json")
+        # Append-only log of changes since the last compaction, shared by all workers
+        self.log_path = os.path.join(storage_dir, "knowledge_store.log")
+        self.compact_every = int(os.environ.get('KB_COMPACT_EVERY', '1000'))
+        self.fsync_log = os.environ.get('KB_LOG_FSYNC', 'false').lower() == 'true'
+        self._log_entries = 0
+        # Held across workers while the log is appended to or the segment and log are swapped
+        self._log_lock = FileLock(self.log_path + ".lock")
+        # At most one worker compacts at a time
+        self._compact_lock = FileLock(os.path.join(storage_dir, "knowledge_store.compact.lock"))
+        self._compact_thread = None
+        # Guards the in-memory state shared by queries on the event loop and
+        # writers in worker threads; only held briefly, never during compaction
+        self._lock = threading.RLock()
+        if load:
+            self._load_store()
+    
+    def __len__(self) -> int:
+        segment_docs = self.segment.doc_count - len(self.deleted) if self.segment else 0
+        return segment_docs + len(self.documents)
     
     def _load_store(self):
-        """Load documents from disk"""
+        """Open the segment (or legacy snapshot) and replay the log on top of it"""
+        # Under the log lock so no worker swaps segment and log in between
+        with self._log_lock.hold():
+            self._load_base()
+            self._replay_log()
+        
+        if self.segment is None and self.documents:
+            # One-off migration from the JSON snapshot to the segment format
+            self.compact()
+        elif self.segment is not None and self.segment.doc_count and self._matrix is None and dense_index.is_available():
+            # Segment predates dense vectors or used another dimension
+            self.compact()
+    
+    def _load_base(self):
+        """Open the segment, falling back to the legacy snapshot"""
+        try:
+            if os.path.exists(self.segment_path):
+                self._open_segment()
+                logger.info(f"Opened segment with {self.segment.doc_count} documents")
+        except Exception as e:
+            logger.warning(f"Could not open store segment: {e}")
+            self.segment = None
+        
+        if self.segment is None:
+            self._load_snapshot()
+    
+    def _open_segment(self):
+        self.segment = Segment(self.segment_path)
+        self._matrix = None
+        vectors = self.segment.vectors()
+        if vectors is not None and self.segment.dim == dense_index.DENSE_DIM and dense_index.is_available():
+            self._matrix = dense_index.np.frombuffer(vectors, dtype=dense_index.np.float32).reshape(
+                self.segment.doc_count, self.segment.dim
+            )
+    
+    def _load_snapshot(self):
+        """Load a legacy JSON snapshot into the in-memory table"""
         try:
             if os.path.exists(self.storage_path):
                 with open(self.storage_path, 'r') as f:
-                    self.documents = json.load(f)
+                    data = json.load(f)
+                
+                if data.get('format') == STORE_FORMAT:
+                    self.documents = data['documents']
+                    self.index = data['index']
+                    self.total_length = data['total_length']
+                else:
+                    # Older stores lack term frequencies - re-tokenize and re-index
+                    documents = data['documents'] if 'index' in data else data
+                    self.documents = {}
+                    for doc_id, doc in documents.items():
+                        self.documents[doc_id] = self._build_document(doc['text'], doc.get('metadata'))
+                    self._rebuild_index()
                 logger.info(f"Loaded {len(self.documents)} documents from store")
         except Exception as e:
             logger.warning(f"Could not load store: {e}")
             self.documents = {}
+            self.index = {}
+            self.total_length = 0
+    
+    def _read_log(self) -> bytes:
+        """The log's complete records; call with the log lock held"""
+        if not os.path.exists(self.log_path):
+            return b''
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        return data[:data.rfind(b'\n') + 1]
+    
+    @staticmethod
+    def _parse_log(data: bytes) -> List[Dict]:
+        records = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping unreadable store log record")
+        return records
     
-    def _save_store(self):
-        """Save documents to disk"""
+    def _replay_log(self):
+        """Apply log records written after the last compaction; call with the log lock held"""
         try:
-            with open(self.storage_path, 'w') as f:
-                json.dump(self.documents, f)
+            if not os.path.exists(self.log_path):
+                return
+            
+            complete = self._read_log()
+            # With the lock held nobody is appending, so anything after the last
+            # newline is a record torn by a crash - drop it
+            if len(complete) != os.path.getsize(self.log_path):
+                logger.warning("Discarding torn record at the end of the store log")
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(len(complete))
+            
+            for record in self._parse_log(complete):
+                self._apply(record)
+                self._log_entries += 1
+            
+            if self._log_entries:
+                logger.info(f"Replayed {self._log_entries} records from store log")
         except Exception as e:
-            logger.error(f"Could not save store: {e}")
+            logger.warning(f"Could not replay store log: {e}")
     
-    def _extract_keywords(self, text: str) -> List[str]:
-        """Extract important keywords from text"""
+    def _apply(self, record: Dict):
+        """Apply a single log record to the in-memory store"""
+        if record.get('op') == 'add':
+            self._put(record['id'], self._build_document(record['text'], record.get('metadata')))
+        elif record.get('op') == 'remove':
+            self._delete(record['id'])
+        elif record.get('op') == 'clear':
+            self._clear_all()
+    
+    def _append_log(self, record: Dict):
+        """Append one record to the log - O(record) I/O; call with the log lock held"""
+        try:
+            # Opened per record: compaction replaces the log file, and a
+            # descriptor kept open would go on writing to the old one
+            with open(self.log_path, 'a+b') as f:
+                line = json.dumps(record).encode() + b'\n'
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        # A worker crashed mid-append - start on a fresh line
+                        line = b'\n' + line
+                f.write(line)
+                f.flush()
+                if self.fsync_log:
+                    os.fsync(f.fileno())
+            self._log_entries += 1
+        except Exception as e:
+            logger.error(f"Could not append to store log: {e}")
+    
+    def _maybe_compact(self):
+        """Compact in a background thread once the log has grown long enough"""
+        if self._log_entries < self.compact_every:
+            return
+        with self._lock:
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return
+            self._compact_thread = threading.Thread(target=self.compact, name="kb-compact", daemon=True)
+            self._compact_thread.start()
+    
+    def compact(self) -> bool:
+        """
+        Fold the log into a new segment and truncate it. Built from what is on
+        disk - the current segment plus every worker's log records - so changes
+        made by other workers are kept, and built without holding the query
+        lock; queries only wait for the final swap. Returns False when another
+        worker is already compacting.
+        """
+        with self._compact_lock.hold(blocking=False) as acquired:
+            if not acquired:
+                return False
+            tmp_path = f"{self.segment_path}.{os.getpid()}.tmp"
+            try:
+                with self._log_lock.hold():
+                    covered = self._read_log()
+                
+                staging = SimpleVectorStore(self.storage_dir, load=False)
+                try:
+                    staging._load_base()
+                    for record in self._parse_log(covered):
+                        staging._apply(record)
+                    staging._write_segment(tmp_path)
+                finally:
+                    staging.close()
+                
+                with self._log_lock.hold():
+                    # Records appended while the segment was built stay in the log
+                    tail = self._read_log()[len(covered):]
+                    # Write-then-rename so a crash never leaves a half-written file; workers
+                    # that still map the old segment keep reading it safely. Replaying records
+                    # the new segment already holds is harmless, so a crash between the two
+                    # renames loses nothing.
+                    os.replace(tmp_path, self.segment_path)
+                    log_tmp = f"{self.log_path}.{os.getpid()}.tmp"
+                    with open(log_tmp, 'wb') as f:
+                        f.write(tail)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(log_tmp, self.log_path)
+                    
+                    tail_records = self._parse_log(tail)
+                    with self._lock:
+                        old_segment = self.segment
+                        self._open_segment()
+                        self.documents = {}
+                        self.index = {}
+                        self.total_length = 0
+                        self.vectors = {}
+                        self.deleted = set()
+                        self.deleted_length = 0
+                        for record in tail_records:
+                            self._apply(record)
+                        self._log_entries = len(tail_records)
+                    if old_segment is not None:
+                        old_segment.close()
+                return True
+            except Exception as e:
+                logger.error(f"Could not compact store: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+    
+    def _write_segment(self, path: str):
+        """Write the segment and recent documents out as one new segment"""
+        documents = []
+        postings = {}
+        
+        # Live segment documents keep their relative order, recent ones follow
+        renumber = {}
+        if self.segment is not None:
+            for n in range(self.segment.doc_count):
+                if n in self.deleted:
+                    continue
+                renumber[n] = len(documents)
+                documents.append((
+                    self.segment.doc_id(n), self.segment.text(n),
+                    self.segment.metadata(n), self.segment.length(n)
+                ))
+            for term, plist in self.segment.iter_postings():
+                live = [(renumber[n], tf) for n, tf in plist if n in renumber]
+                if live:
+                    postings[term] = live
+        
+        recent_numbers = {}
+        for doc_id, doc in self.documents.items():
+            recent_numbers[doc_id] = len(documents)
+            documents.append((doc_id, doc['text'], doc['metadata'], doc['length']))
+        for term, doc_tfs in self.index.items():
+            plist = postings.setdefault(term, [])
+            plist.extend(sorted((recent_numbers[doc_id], tf) for doc_id, tf in doc_tfs.items()))
+        
+        vectors = self._merged_vectors(renumber) if dense_index.is_available() else b''
+        write_segment(path, documents, postings, vectors, dense_index.DENSE_DIM)
+    
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+            self._matrix = None
+    
+    def _merged_vectors(self, renumber: Dict[int, int]) -> bytes:
+        """Dense rows for a compacted segment, in the same order as its documents"""
+        np = dense_index.np
+        rows = []
+        for n in renumber:
+            if self._matrix is not None:
+                rows.append(self._matrix[n])
+            else:
+                rows.append(dense_index.embed(self._build_document(self.segment.text(n))['term_freqs']))
+        rows.extend(self.vectors[doc_id] for doc_id in self.documents)
+        if not rows:
+            return b''
+        return np.ascontiguousarray(np.vstack(rows), dtype=np.float32).tobytes()
+    
+    def _tokenize(self, text: str) -> List[str]:
+        """Split text into keyword tokens, keeping repeats"""
         # Remove common stop words
         stop_words = {
             'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
@@ -58,57 +347,298 @@ class SimpleVectorStore:
         
         words = text.lower().split()
         # Clean words and filter
-        keywords = []
+        tokens = []
         for word in words:
             clean = ''.join(c for c in word if c.isalnum())
             if clean and len(clean) > 2 and clean not in stop_words:
-                keywords.append(clean)
+                tokens.append(clean)
         
-        return list(set(keywords))
+        return tokens
     
-    def add(self, doc_id: str, text: str, metadata: Dict = None):
-        """Add a document to the store"""
-        keywords = self._extract_keywords(text)
-        self.documents[doc_id] = {
+    def _extract_keywords(self, text: str) -> List[str]:
+        """Extract important keywords from text"""
+        return list(set(self._tokenize(text)))
+    
+    def _build_document(self, text: str, metadata: Dict = None) -> Dict:
+        tokens = self._tokenize(text)
+        term_freqs = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+        
+        return {
             'text': text,
             'metadata': metadata or {},
-            'keywords': keywords
+            'keywords': list(term_freqs),
+            'term_freqs': term_freqs,
+            'length': len(tokens)
         }
-        self._save_store()
     
-    def query(self, question: str, n_results: int = 3) -> List[str]:
-        """Query documents using keyword matching"""
-        if not self.documents:
-            return []
-        
+    def _rebuild_index(self):
+        """Rebuild the inverted index and corpus statistics from the loaded documents"""
+        self.index = {}
+        self.total_length = 0
+        for doc_id, doc in self.documents.items():
+            self._index_document(doc_id, doc)
+    
+    def _index_document(self, doc_id: str, doc: Dict):
+        for term, tf in doc['term_freqs'].items():
+            self.index.setdefault(term, {})[doc_id] = tf
+        self.total_length += doc['length']
+        if dense_index.is_available():
+            self.vectors[doc_id] = dense_index.embed(doc['term_freqs'])
+    
+    def _unindex_document(self, doc_id: str):
+        doc = self.documents.get(doc_id)
+        if not doc:
+            return
+        for term in doc['term_freqs']:
+            postings = self.index.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.index[term]
+        self.total_length -= doc['length']
+        self.vectors.pop(doc_id, None)
+    
+    def _segment_find(self, doc_id: str):
+        """Get the live segment doc number for a doc id, or None"""
+        if self.segment is None:
+            return None
+        n = self.segment.find(doc_id)
+        if n is None or n in self.deleted:
+            return None
+        return n
+    
+    def _tombstone(self, n: int):
+        self.deleted.add(n)
+        self.deleted_length += self.segment.length(n)
+    
+    def _put(self, doc_id: str, doc: Dict):
+        # Re-adding a chunk replaces its old postings and masks any compacted copy
+        self._unindex_document(doc_id)
+        n = self._segment_find(doc_id)
+        if n is not None:
+            self._tombstone(n)
+        self.documents[doc_id] = doc
+        self._index_document(doc_id, doc)
+    
+    def _delete(self, doc_id: str) -> bool:
+        removed = False
+        if doc_id in self.documents:
+            self._unindex_document(doc_id)
+            del self.documents[doc_id]
+            removed = True
+        n = self._segment_find(doc_id)
+        if n is not None:
+            self._tombstone(n)
+            removed = True
+        return removed
+    
+    def add(self, doc_id: str, text: str, metadata: Dict = None):
+        """Add a document to the store"""
+        doc = self._build_document(text, metadata)
+        # Log order and in-memory order agree because both happen under the log lock
+        with self._log_lock.hold():
+            with self._lock:
+                self._put(doc_id, doc)
+            self._append_log({'op': 'add', 'id': doc_id, 'text': text, 'metadata': metadata or {}})
+        self._maybe_compact()
+    
+    def remove(self, doc_id: str) -> bool:
+        """Remove a document from the store"""
+        with self._log_lock.hold():
+            with self._lock:
+                if not self._delete(doc_id):
+                    return False
+            self._append_log({'op': 'remove', 'id': doc_id})
+        self._maybe_compact()
+        return True
+    
+    def ids_with_prefix(self, prefix: str) -> List[str]:
+        """Get the ids of all live documents starting with prefix"""
+        with self._lock:
+            ids = [doc_id for doc_id in self.documents if doc_id.startswith(prefix)]
+            if self.segment:
+                ids += [doc_id for doc_id, n in self.segment.ids_with_prefix(prefix) if n not in self.deleted]
+            return ids
+    
+    def query(self, question: str, n_results: int = 3, scoring: str = None) -> List[str]:
+        """Query documents using BM25 (default), plain keyword overlap or dense vectors"""
+        return [text for _, _, text in self.search(question, n_results, scoring)]
+    
+    def search(self, question: str, n_results: int = 3, scoring: str = None) -> List[Tuple[str, float, str]]:
+        """Like query, but returns (doc id, score, text) for each hit, best first"""
         query_keywords = set(self._extract_keywords(question))
         if not query_keywords:
             return []
         
-        # Score each document by keyword overlap
-        scores = []
-        for doc_id, doc in self.documents.items():
-            doc_keywords = set(doc['keywords'])
-            overlap = len(query_keywords & doc_keywords)
-            if overlap > 0:
-                # Score = overlap / query length (for relevance)
-                score = overlap / len(query_keywords)
-                scores.append((score, doc['text']))
+        scoring = scoring or self.scoring
+        with self._lock:
+            if len(self) == 0:
+                return []
+            
+            if scoring == 'overlap':
+                scores = self._score_overlap(query_keywords)
+            elif scoring == 'dense':
+                scores = self._score_dense(question, n_results)
+            else:
+                scores = self._score_bm25(query_keywords)
+            
+            # Only the top hits have their text materialized
+            top = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(self._doc_id(key), score, self._text(key)) for key, score in top]
+    
+    def _postings(self, term: str) -> List[Tuple]:
+        """
+        Get postings for a term across the segment and recent documents.
+        Returns (key, tf) pairs where keys are segment doc numbers (int)
+        or recent doc ids (str).
+        """
+        postings = list(self.index.get(term, {}).items())
+        if self.segment is not None:
+            flat = self.segment.postings_flat(term)
+            deleted = self.deleted
+            if deleted:
+                postings.extend((n, tf) for n, tf in zip(flat[0::2], flat[1::2]) if n not in deleted)
+            else:
+                postings.extend(zip(flat[0::2], flat[1::2]))
+        return postings
+    
+    def _length(self, key) -> int:
+        return self.segment.lengths[key] if isinstance(key, int) else self.documents[key]['length']
+    
+    def _doc_id(self, key) -> str:
+        return self.segment.doc_id(key) if isinstance(key, int) else key
+    
+    def _text(self, key) -> str:
+        return self.segment.text(key) if isinstance(key, int) else self.documents[key]['text']
+    
+    def _score_overlap(self, query_keywords: set) -> Dict:
+        """Score = overlap / query length, only for documents sharing a term"""
+        overlaps = {}
+        for term in query_keywords:
+            for key, _ in self._postings(term):
+                overlaps[key] = overlaps.get(key, 0) + 1
+        return {key: overlap / len(query_keywords) for key, overlap in overlaps.items()}
+    
+    def _score_bm25(self, query_keywords: set) -> Dict:
+        """Okapi BM25 using the incrementally maintained corpus statistics"""
+        n_docs = len(self)
+        total_length = self.total_length
+        if self.segment is not None:
+            total_length += self.segment.total_length - self.deleted_length
+        avg_length = total_length / n_docs if n_docs else 0
+        
+        # tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)), with the constants hoisted
+        if avg_length:
+            norm_base, norm_per_token = BM25_K1 * (1 - BM25_B), BM25_K1 * BM25_B / avg_length
+        else:
+            norm_base, norm_per_token = BM25_K1, 0.0
+        
+        scores = {}
+        for term in query_keywords:
+            postings = self._postings(term)
+            if not postings:
+                continue
+            
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            weight = idf * (BM25_K1 + 1)
+            for key, tf in postings:
+                norm = norm_base + norm_per_token * self._length(key)
+                scores[key] = scores.get(key, 0.0) + weight * tf / (tf + norm)
+        return scores
+    
+    def _score_dense(self, question: str, n_results: int) -> Dict:
+        """Cosine similarity of hashed dense vectors; only the best rows are returned"""
+        if not dense_index.is_available():
+            logger.warning("Dense retrieval requested but NumPy is not installed")
+            return {}
         
-        # Sort by score and return top results
-        scores.sort(reverse=True, key=lambda x: x[0])
-        return [text for _, text in scores[:n_results]]
+        np = dense_index.np
+        query_vector = dense_index.embed(self._build_document(question)['term_freqs'])
+        scores = {}
+        if self._matrix is not None:
+            for n, score in dense_index.top_k(self._matrix, query_vector, n_results, exclude=self.deleted):
+                scores[n] = score
+        if self.vectors:
+            recent_ids = list(self.vectors)
+            recent = np.vstack([self.vectors[doc_id] for doc_id in recent_ids])
+            for row, score in dense_index.top_k(recent, query_vector, n_results):
+                scores[recent_ids[row]] = score
+        return scores
+    
+    def _clear_all(self):
+        self.documents = {}
+        self.index = {}
+        self.total_length = 0
+        self.vectors = {}
+        self.deleted = set(range(self.segment.doc_count)) if self.segment else set()
+        self.deleted_length = self.segment.total_length if self.segment else 0
     
     def clear(self):
         """Clear all documents"""
-        self.documents = {}
-        self._save_store()
+        # Logged like any other change, so the compaction below - or a later one - applies it
+        with self._log_lock.hold():
+            with self._lock:
+                self._clear_all()
+            self._append_log({'op': 'clear'})
+        self.compact()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TextChunker:
+    """
+    Word-based chunker that accepts text piece by piece. Feeding pages one at
+    a time yields the same chunks as chunking the joined text in one go.
+    """
+    
+    def __init__(self, chunk_size: int = 500):
+        self.chunk_size = chunk_size
+        self._words = []
+        self._size = 0
+    
+    def feed(self, text: str) -> List[str]:
+        """Add text, returns the chunks it completed"""
+        chunks = []
+        for word in text.split():
+            self._words.append(word)
+            self._size += len(word) + 1
+            
+            if self._size >= self.chunk_size:
+                chunks.append(' '.join(self._words))
+                self._words = []
+                self._size = 0
+        return chunks
+    
+    def flush(self) -> List[str]:
+        """Get the final partial chunk, if any"""
+        chunks = [' '.join(self._words)] if self._words else []
+        self._words = []
+        self._size = 0
+        return chunks
 
 
 class KnowledgeBase:
-    def __init__(self):
+    def __init__(self, storage_dir: str = "/app/backend"):
         # Use simple vector store for deployment compatibility
-        self.store = SimpleVectorStore()
+        self.store = SimpleVectorStore(storage_dir)
+        # Background crawl state - at most one crawl per process per interval
+        self.crawl_interval = int(os.environ.get('KB_CRAWL_INTERVAL_SECONDS', '3600'))
+        self.version = 0
+        self.last_crawled_at = None
+        self._crawl_task = None
+        self.crawler = WebsiteCrawler(self, os.path.join(self.store.storage_dir, "crawl_state.json"))
+        self.ingest_cache = IngestCache(os.path.join(storage_dir, "ingest_cache"))
+        # doc_id -> [lock, holders]; dropped when nobody holds or waits for it
+        self._ingest_locks: Dict[str, list] = {}
         logger.info("Knowledge Base initialized (deployment-ready mode)")
     
     def add_document(self, doc_id: str, text: str, metadata: Dict = None):
@@ -117,136 +647,243 @@ class KnowledgeBase:
             # Split text into chunks for better retrieval
             chunks = self._chunk_text(text)
             
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{doc_id}_chunk_{i}"
-                self.store.add(chunk_id, chunk, metadata)
+            self._add_chunks([(f"{doc_id}_chunk_{i}", chunk) for i, chunk in enumerate(chunks)], metadata)
             
+            # A shorter new version must not leave the old tail chunks behind
+            stale = self._remove_chunks(doc_id, keep=len(chunks))
+            
+            if chunks or stale:
+                self.version += 1
             logger.info(f"Added document {doc_id} with {len(chunks)} chunks")
             return True
         except Exception as e:
             logger.error(f"Error adding document: {e}")
             return False
     
-    def query(self, question: str, n_results: int = 3) -> List[str]:
+    def remove_document(self, doc_id: str) -> int:
+        """Remove every chunk of a document, returns the number of chunks removed"""
+        try:
+            removed = self._remove_chunks(doc_id)
+            if removed:
+                self.version += 1
+                logger.info(f"Removed document {doc_id} ({removed} chunks)")
+            return removed
+        except Exception as e:
+            logger.error(f"Error removing document: {e}")
+            return 0
+    
+    def _remove_chunks(self, doc_id: str, keep: int = 0) -> int:
+        prefix = f"{doc_id}_chunk_"
+        removed = 0
+        for chunk_id in self.store.ids_with_prefix(prefix):
+            index = chunk_id[len(prefix):]
+            if index.isdigit() and int(index) < keep:
+                continue
+            if self.store.remove(chunk_id):
+                removed += 1
+        return removed
+    
+    def query(self, question: str, n_results: int = 3, scoring: str = None) -> List[str]:
         """Query the knowledge base"""
         try:
-            results = self.store.query(question, n_results)
+            results = self.store.query(question, n_results, scoring)
             return results
         except Exception as e:
             logger.error(f"Error querying knowledge base: {e}")
             return []
     
+    def search(self, question: str, n_results: int = 3, scoring: str = None) -> List[Tuple[str, float, str]]:
+        """Query the knowledge base, keeping chunk ids and scores for ranking fusion"""
+        try:
+            return self.store.search(question, n_results, scoring)
+        except Exception as e:
+            logger.error(f"Error searching knowledge base: {e}")
+            return []
+    
     def _chunk_text(self, text: str, chunk_size: int = 500) -> List[str]:
         """Split text into chunks"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for word in words:
-            current_chunk.append(word)
-            current_size += len(word) + 1
-            
-            if current_size >= chunk_size:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_size = 0
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+        chunker = TextChunker(chunk_size)
+        return chunker.feed(text) + chunker.flush()
+    
+    def _add_chunks(self, chunks: List[Tuple[str, str]], metadata: Dict = None):
+        for chunk_id, chunk in chunks:
+            self.store.add(chunk_id, chunk, metadata)
     
-    def crawl_website(self, base_url: str) -> bool:
-        """Crawl website pages and add to knowledge base"""
+    def _remove_ids(self, chunk_ids: Iterable[str]) -> int:
+        return sum(1 for chunk_id in chunk_ids if self.store.remove(chunk_id))
+    
+    async def crawl_website(self, base_url: str) -> bool:
+        """Crawl website pages from the sitemap, re-indexing only pages that changed"""
         try:
-            pages = [
-                f"{base_url}/",
-                f"{base_url}/about",
-                f"{base_url}/services",
-                f"{base_url}/products",
-            ]
-            
-            for page_url in pages:
-                try:
-                    response = requests.get(page_url, timeout=10)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Remove script and style elements
-                        for script in soup(["script", "style"]):
-                            script.decompose()
-                        
-                        # Get text
-                        text = soup.get_text()
-                        lines = (line.strip() for line in text.splitlines())
-                        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                        text = '\n'.join(chunk for chunk in chunks if chunk)
-                        
-                        # Create doc_id from URL
-                        doc_id = hashlib.md5(page_url.encode()).hexdigest()[:12]
-                        
-                        self.add_document(
-                            doc_id=doc_id,
-                            text=text,
-                            metadata={"source": page_url, "type": "webpage"}
-                        )
-                        
-                        logger.info(f"Crawled and added: {page_url}")
-                except Exception as e:
-                    logger.error(f"Error crawling {page_url}: {e}")
-                    continue
-            
+            stats = await self.crawler.crawl(base_url)
+            logger.info(f"Website crawl: {stats}")
             return True
         except Exception as e:
             logger.error(f"Error in website crawl: {e}")
             return False
     
-    def process_pdf(self, file_content: bytes, filename: str) -> bool:
+    @property
+    def is_crawling(self) -> bool:
+        return self._crawl_task is not None and not self._crawl_task.done()
+    
+    def schedule_crawl(self, base_url: str, force: bool = False) -> bool:
+        """
+        Start a background crawl unless one is already running or the last
+        crawl is younger than the configured interval.
+        Must be called from the event loop: the check and the task creation
+        happen without an await in between, so concurrent callers start at
+        most one crawl.
+        """
+        if self.is_crawling:
+            return False
+        
+        if not force and self.last_crawled_at is not None:
+            if time.time() - self.last_crawled_at < self.crawl_interval:
+                return False
+        
+        self._crawl_task = asyncio.get_running_loop().create_task(self._run_crawl(base_url))
+        return True
+    
+    async def _run_crawl(self, base_url: str):
+        """Run a crawl in the background"""
+        try:
+            success = await self.crawl_website(base_url)
+            logger.info(f"Background crawl finished (success={success}, version={self.version})")
+        except Exception as e:
+            logger.error(f"Background crawl failed: {e}")
+        finally:
+            # Failed crawls also wait for the next interval instead of retrying on every init
+            self.last_crawled_at = time.time()
+    
+    def get_status(self) -> Dict:
+        """Get knowledge base readiness for clients"""
+        last_crawled = None
+        if self.last_crawled_at is not None:
+            last_crawled = datetime.fromtimestamp(self.last_crawled_at, tz=timezone.utc).isoformat()
+        
+        return {
+            "ready": len(self.store) > 0,
+            "kb_version": self.version,
+            "crawling": self.is_crawling,
+            "last_crawled_at": last_crawled
+        }
+    
+    async def process_pdf(self, file_path: str, filename: str) -> bool:
         """Process a PDF file and add to knowledge base"""
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            doc_id = hashlib.md5(filename.encode()).hexdigest()[:12]
-            return self.add_document(
-                doc_id=doc_id,
-                text=text,
-                metadata={"source": filename, "type": "pdf"}
-            )
+            await self.ingest_file(file_path, filename, "pdf")
+            return True
         except Exception as e:
             logger.error(f"Error processing PDF: {e}")
             return False
     
-    def process_pptx(self, file_content: bytes, filename: str) -> bool:
+    async def process_pptx(self, file_path: str, filename: str) -> bool:
         """Process a PowerPoint file and add to knowledge base"""
         try:
-            prs = Presentation(io.BytesIO(file_content))
-            text = ""
-            
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            
-            doc_id = hashlib.md5(filename.encode()).hexdigest()[:12]
-            return self.add_document(
-                doc_id=doc_id,
-                text=text,
-                metadata={"source": filename, "type": "pptx"}
-            )
+            await self.ingest_file(file_path, filename, "pptx")
+            return True
         except Exception as e:
             logger.error(f"Error processing PPTX: {e}")
             return False
     
+    async def ingest_file(self, file_path: str, filename: str, file_type: str, file_hash: str = None, doc_id: str = None) -> Dict:
+        """
+        Index an uploaded file, touching only the chunks that changed.
+        
+        Chunk ids are derived from the chunk text, so a revised file keeps the
+        ids of its unchanged chunks: only new chunks are indexed and chunks
+        that are gone are removed. An identical re-upload is a no-op, and a
+        file seen before is not parsed again. Uploads of the same document
+        are indexed one at a time, each against the result of the previous.
+        """
+        doc_id = doc_id or hashlib.md5(filename.encode()).hexdigest()[:12]
+        async with self._ingest_lock(doc_id):
+            return await self._ingest_file(file_path, filename, file_type, file_hash, doc_id)
+    
+    @asynccontextmanager
+    async def _ingest_lock(self, doc_id: str):
+        entry = self._ingest_locks.get(doc_id)
+        if entry is None:
+            entry = self._ingest_locks[doc_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._ingest_locks[doc_id]
+    
+    async def _ingest_file(self, file_path: str, filename: str, file_type: str, file_hash: str, doc_id: str) -> Dict:
+        prefix = f"{doc_id}_chunk_"
+        if file_hash is None:
+            file_hash = await asyncio.to_thread(_file_sha256, file_path)
+        
+        existing = set(self.store.ids_with_prefix(prefix))
+        if existing and self.ingest_cache.document_hash(doc_id) == file_hash:
+            logger.info(f"Document {doc_id} unchanged, skipping")
+            return {"doc_id": doc_id, "status": "unchanged", "added": 0, "removed": 0}
+        
+        metadata = {"source": filename, "type": file_type}
+        cached = self.ingest_cache.has_chunks(file_hash)
+        writer = None if cached else self.ingest_cache.writer(file_hash)
+        pages = self._cached_pages(file_hash) if cached else self._parse_pages(file_path, file_type)
+        seen = set()
+        added = 0
+        
+        try:
+            async for chunks in pages:
+                if writer:
+                    writer.write(chunks)
+                
+                new_chunks = []
+                for chunk in chunks:
+                    chunk_id = prefix + hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]
+                    if chunk_id in seen:
+                        continue
+                    seen.add(chunk_id)
+                    if chunk_id not in existing:
+                        new_chunks.append((chunk_id, chunk))
+                
+                if new_chunks:
+                    await asyncio.to_thread(self._add_chunks, new_chunks, metadata)
+                    added += len(new_chunks)
+            
+            if writer:
+                writer.commit()
+                self.ingest_cache.prune()
+        finally:
+            if writer:
+                writer.discard()
+        
+        # Replaces the previous version, including chunks from before ids were content hashes
+        removed = await asyncio.to_thread(self._remove_ids, existing - seen)
+        
+        if added or removed:
+            self.version += 1
+        self.ingest_cache.set_document_hash(doc_id, file_hash)
+        logger.info(f"Indexed document {doc_id}: {added} chunks added, {removed} removed, {len(seen)} total (cache {'hit' if cached else 'miss'})")
+        return {"doc_id": doc_id, "status": "updated", "added": added, "removed": removed}
+    
+    async def _parse_pages(self, file_path: str, file_type: str) -> AsyncIterator[List[str]]:
+        # Chunks never span pages, so editing one slide only changes that slide's chunks
+        chunker = TextChunker()
+        async for page in document_parser.iter_pages(file_path, file_type):
+            chunks = chunker.feed(page) + chunker.flush()
+            if chunks:
+                yield chunks
+    
+    async def _cached_pages(self, file_hash: str) -> AsyncIterator[List[str]]:
+        for chunks in self.ingest_cache.read_chunks(file_hash):
+            yield chunks
+    
     def get_stats(self) -> Dict:
         """Get knowledge base statistics"""
         return {
-            "total_documents": len(self.store.documents),
-            "storage_mode": "keyword-based (deployment-ready)"
+            "total_documents": len(self.store),
+            "storage_mode": "keyword-based (deployment-ready)",
+            "scoring": self.store.scoring,
+            "dense_available": dense_index.is_available()
         }
 
 # Global instance
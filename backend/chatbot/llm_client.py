@@ -0,0 +1,151 @@
+"""
+Shared LLM transport.
+
+Every LLM call goes through litellm with one AsyncOpenAI client per API
+endpoint, created once per process. That client owns an httpx connection
+pool, so connections to the provider - with their TLS sessions - are kept
+alive and reused across turns instead of being set up for each message.
+
+Nothing about a conversation lives on the client: each call sends its
+complete message list, so no state can carry over from one visitor's
+request to another's.
+
+Emergent universal keys are sent through the Emergent LLM proxy, as the
+emergentintegrations library does; other keys go to the provider directly.
+"""
+import os
+import logging
+from typing import Callable, Dict, Optional
+import httpx
+import litellm
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = "openai"
+DEFAULT_MODEL = "gpt-4o"
+
+MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '64'))
+MAX_KEEPALIVE = int(os.environ.get('LLM_MAX_KEEPALIVE', '16'))  # idle connections kept open
+KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_SECONDS', '60'))
+REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT_SECONDS', '60'))
+EMERGENT_PROXY_URL = os.environ.get('EMERGENT_LLM_PROXY_URL', 'https://integrations.emergentagent.com/llm')
+
+
+class LLMClient:
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.api_key = None
+        self._transports: Dict[Optional[str], AsyncOpenAI] = {}  # api base -> client
+        self.requests = 0
+        self.failed = 0
+
+    def _get_api_key(self):
+        if not self.api_key:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self.api_key = os.environ.get('EMERGENT_LLM_KEY')
+            if not self.api_key:
+                raise ValueError("EMERGENT_LLM_KEY not found in environment")
+        return self.api_key
+
+    def has_api_key(self) -> bool:
+        try:
+            self._get_api_key()
+            return True
+        except ValueError:
+            return False
+
+    def _api_base(self) -> Optional[str]:
+        return EMERGENT_PROXY_URL if self._get_api_key().startswith('sk-emergent-') else None
+
+    def _transport(self, api_base: Optional[str]) -> AsyncOpenAI:
+        client = self._transports.get(api_base)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self._get_api_key(),
+                base_url=api_base,
+                # The LLM guard fails over to another model instead of retrying
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self.limits, timeout=httpx.Timeout(REQUEST_TIMEOUT))
+            )
+            self._transports[api_base] = client
+        return client
+
+    def request_params(self, model: str = DEFAULT_MODEL, provider: str = DEFAULT_PROVIDER) -> Dict:
+        """litellm arguments selecting the model, key and pooled transport"""
+        api_base = self._api_base()
+        params = {"model": f"{provider}/{model}", "api_key": self._get_api_key()}
+        if api_base:
+            params["api_base"] = api_base
+        if api_base or provider == "openai":
+            # OpenAI-compatible endpoints take the shared client; other providers use litellm's own
+            params["client"] = self._transport(api_base)
+        return params
+
+    async def complete(
+        self,
+        system_message: str,
+        text: str,
+        model: str = DEFAULT_MODEL,
+        provider: str = DEFAULT_PROVIDER,
+        token_sink: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        One stateless chat completion: the system prompt and a single user
+        message. With a token_sink the reply is streamed and each piece is
+        passed to it as it arrives; the full text is returned either way.
+        """
+        self.requests += 1
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": text}
+        ]
+        try:
+            if token_sink is None:
+                response = await litellm.acompletion(messages=messages, **self.request_params(model, provider))
+                return response.choices[0].message.content or ""
+            
+            parts = []
+            stream = await litellm.acompletion(messages=messages, stream=True, **self.request_params(model, provider))
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    parts.append(token)
+                    token_sink(token)
+            return "".join(parts)
+        except Exception:
+            self.failed += 1
+            raise
+
+    def warm(self) -> bool:
+        """Create the shared transport ahead of the first request"""
+        self.request_params()
+        return bool(self._transports)
+
+    async def close(self):
+        for client in self._transports.values():
+            await client.close()
+        self._transports = {}
+
+    def get_stats(self) -> Dict:
+        return {
+            "transports": len(self._transports),
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "requests": self.requests,
+            "failed": self.failed
+        }
+
+# Global instance
+llm_client = LLMClient()
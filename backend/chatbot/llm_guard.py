@@ -0,0 +1,277 @@
+"""
+Latency guard for LLM calls.
+
+Every call gets a deadline. When the primary model has not answered within
+its recent p95 latency, a hedged request goes to the fallback model and the
+first reply wins; the other request is cancelled. A primary call that fails
+outright is retried on the fallback within the same deadline, unless the
+fallback's breaker is open. Models that keep failing or running into the
+deadline trip a circuit breaker and are skipped for a cool-down period;
+a primary that merely lost the race to its hedge is not counted.
+
+Streaming calls are hedged too: whichever request produces the first token
+claims the stream, and from then on only that request is awaited.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_MODEL = os.environ.get('LLM_PRIMARY_MODEL', 'gpt-4o')
+FALLBACK_MODEL = os.environ.get('LLM_FALLBACK_MODEL', 'gpt-4o-mini')
+
+DEADLINE = float(os.environ.get('LLM_DEADLINE_SECONDS', '20'))
+HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', '0.95'))
+HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', '20'))
+LATENCY_WINDOW = int(os.environ.get('LLM_LATENCY_WINDOW', '200'))
+BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', '5'))
+BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
+
+# send(model, token_sink) -> full reply text
+SendFn = Callable[[str, Optional[Callable[[str], None]]], Awaitable[str]]
+
+
+class LatencyTracker:
+    """Rolling window of call latencies for one model"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after the cool-down one call is let through as a trial"""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if time.monotonic() < self.open_until:
+            return False
+        if self.failures >= self.threshold:
+            # Half-open: hold the breaker for this trial call
+            self.open_until = time.monotonic() + self.cooldown
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.failures == self.threshold:
+                self.opened += 1
+            self.open_until = time.monotonic() + self.cooldown
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+
+class LLMGuard:
+    def __init__(
+        self,
+        primary: str = PRIMARY_MODEL,
+        fallback: Optional[str] = FALLBACK_MODEL,
+        deadline: float = DEADLINE
+    ):
+        self.primary = primary
+        self.fallback = fallback if fallback and fallback != primary else None
+        self.deadline = deadline
+        self.in_flight = 0
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.deadline_exceeded = 0
+        self.short_circuited = 0
+        self.failovers = 0
+
+    def _tracker(self, model: str) -> LatencyTracker:
+        return self.latency.setdefault(model, LatencyTracker())
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        return self.breakers.setdefault(model, CircuitBreaker())
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        tracker = self._tracker(model)
+        if len(tracker.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(HEDGE_PERCENTILE)
+
+    async def call(
+        self,
+        send: SendFn,
+        token_sink: Optional[Callable[[str], None]] = None,
+        model: Optional[str] = None,
+        fallback: Optional[str] = None
+    ) -> str:
+        """
+        Run send() against a model (the configured primary by default),
+        hedging and failing over to the fallback as needed
+        """
+        self.calls += 1
+        primary = model or self.primary
+        fallback = fallback or self.fallback
+        if fallback == primary:
+            fallback = None
+        if not self._breaker(primary).allow():
+            if fallback and self._breaker(fallback).allow():
+                self.short_circuited += 1
+                primary, fallback = fallback, None
+            # Both models degraded: still try the primary rather than fail outright
+
+        self.in_flight += 1
+        try:
+            return await asyncio.wait_for(self._race(send, primary, fallback, token_sink), self.deadline)
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            logger.warning(f"LLM call exceeded the {self.deadline:.0f}s deadline")
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def is_degraded(self, models: Optional[Iterable[str]] = None) -> bool:
+        """
+        Every one of models - those the caller may send to, the configured
+        primary and fallback by default - is behind an open breaker
+        """
+        if models is None:
+            models = (self.primary, self.fallback)
+        models = [model for model in models if model]
+        return bool(models) and all(self._breaker(model).is_open for model in models)
+
+    async def _race(self, send: SendFn, primary: str, fallback: Optional[str], token_sink) -> str:
+        started = time.monotonic()
+        attempts: Dict[asyncio.Task, str] = {}
+        attempt_started: Dict[asyncio.Task, float] = {}  # latency is per request, not per call
+        claimed = []  # the model whose tokens reach the sink
+        tried = set()
+        hedge = None
+        answered = False
+
+        def start(model: str):
+            sink = None
+            if token_sink is not None:
+                def sink(token: str, model=model):
+                    if not claimed:
+                        claimed.append(model)
+                    if claimed[0] == model:
+                        token_sink(token)
+            tried.add(model)
+            task = asyncio.ensure_future(send(model, sink))
+            attempts[task] = model
+            attempt_started[task] = time.monotonic()
+
+        start(primary)
+        hedge_delay = self._hedge_delay(primary) if fallback else None
+        hedged = False
+        try:
+            while attempts:
+                timeout = None
+                if hedge_delay is not None and not hedged:
+                    timeout = max(0.0, hedge_delay - (time.monotonic() - started))
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slower than its p95 - hedge unless a token already committed the stream
+                    hedged = True
+                    if not claimed and self._breaker(fallback).allow():
+                        self.hedges_fired += 1
+                        hedge = fallback
+                        start(hedge)
+                    continue
+
+                for task in done:
+                    model = attempts.pop(task)
+                    elapsed = time.monotonic() - attempt_started[task]
+                    if task.exception() is not None:
+                        self._breaker(model).record_failure()
+                        logger.warning(f"LLM call to {model} failed: {task.exception()}")
+                        if (
+                            not attempts and fallback and fallback not in tried and not claimed and
+                            self._breaker(fallback).allow()
+                        ):
+                            # Fail over within the remaining deadline
+                            self.failovers += 1
+                            hedged = True
+                            start(fallback)
+                            continue
+                        if not attempts:
+                            raise task.exception()
+                        continue
+                    if claimed and claimed[0] != model:
+                        # Finished without streaming while the other request owns the stream
+                        continue
+                    self._tracker(model).record(elapsed)
+                    self._breaker(model).record_success()
+                    if model == hedge:
+                        self.hedges_won += 1
+                    answered = True
+                    return task.result()
+
+                # A request that lost the stream is no longer worth waiting for
+                if claimed:
+                    for task, model in list(attempts.items()):
+                        if model != claimed[0]:
+                            task.cancel()
+                            del attempts[task]
+            raise RuntimeError("No LLM reply")
+        finally:
+            for task, model in attempts.items():
+                task.cancel()
+                # Censored sample: the request took at least this long
+                self._tracker(model).record(time.monotonic() - attempt_started[task])
+                if model == primary and not answered:
+                    # Ran into the deadline; losing to the hedge is slow, not broken
+                    self._breaker(model).record_failure()
+
+    def get_stats(self) -> Dict:
+        models = {}
+        for model in set(self.latency) | set(self.breakers):
+            tracker = self._tracker(model)
+            breaker = self._breaker(model)
+            p50 = tracker.percentile(0.5)
+            p95 = tracker.percentile(HEDGE_PERCENTILE)
+            models[model] = {
+                "samples": len(tracker.samples),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "breaker_open": breaker.is_open,
+                "consecutive_failures": breaker.failures,
+                "breaker_opened": breaker.opened
+            }
+        return {
+            "primary": self.primary,
+            "fallback": self.fallback,
+            "deadline_seconds": self.deadline,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "deadline_exceeded": self.deadline_exceeded,
+            "short_circuited": self.short_circuited,
+            "failovers": self.failovers,
+            "models": models
+        }
+
+# Global instance
+llm_guard = LLMGuard()
@@ -0,0 +1,168 @@
+"""
+Bucketed chat message storage.
+
+Messages live in the chat_messages collection rather than in an ever
+growing array on the session. Each bucket document holds up to
+CHAT_BUCKET_SIZE consecutive messages of one session, keyed by
+(session_id, bucket); a message's sequence number seq is its position in
+the conversation, so it sits in bucket seq // CHAT_BUCKET_SIZE. The session
+keeps a message_count, which is what hands out sequence numbers.
+
+Sessions written before buckets existed still carry an embedded messages
+array. ensure_bucketed copies it into buckets the first time such a session
+is touched, and only then removes it from the session.
+"""
+import os
+import logging
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from .turn_metrics import count_db_op
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SIZE = int(os.environ.get('CHAT_BUCKET_SIZE', '50'))
+# Messages the chat hot path loads for context
+HOT_WINDOW = int(os.environ.get('CHAT_HOT_WINDOW', '20'))
+
+
+def bucket_of(seq: int) -> int:
+    return seq // BUCKET_SIZE
+
+
+async def ensure_indexes(db):
+    await db.chat_messages.create_index([("session_id", ASCENDING), ("bucket", ASCENDING)], unique=True)
+
+
+async def append_messages(db, session_id: str, first_seq: int, messages: List[Dict]):
+    """Store messages under consecutive sequence numbers starting at first_seq"""
+    now = datetime.utcnow()
+    numbered = [{**message, "seq": first_seq + i} for i, message in enumerate(messages)]
+    operations = [
+        UpdateOne(
+            {"session_id": session_id, "bucket": bucket},
+            {
+                "$push": {"messages": {"$each": list(group)}},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now}
+            },
+            upsert=True
+        )
+        for bucket, group in groupby(numbered, key=lambda message: bucket_of(message["seq"]))
+    ]
+    if operations:
+        await db.chat_messages.bulk_write(operations, ordered=False)
+        count_db_op()
+
+
+async def load_range(db, session_id: str, first_seq: int, last_seq: int) -> List[Dict]:
+    """Messages with first_seq <= seq <= last_seq, in order"""
+    if last_seq < first_seq:
+        return []
+    buckets = await db.chat_messages.find(
+        {"session_id": session_id, "bucket": {"$gte": bucket_of(first_seq), "$lte": bucket_of(last_seq)}},
+        {"_id": 0, "messages": 1}
+    ).sort("bucket", ASCENDING).to_list(None)
+    count_db_op()
+    messages = [
+        message
+        for bucket in buckets
+        for message in bucket.get("messages", [])
+        if first_seq <= message.get("seq", -1) <= last_seq
+    ]
+    # Concurrent turns may push into a bucket out of order
+    return sorted(messages, key=lambda message: message["seq"])
+
+
+async def load_recent(db, session: Dict, window: int = HOT_WINDOW) -> List[Dict]:
+    """The last window messages of a bucketed session"""
+    count = session.get("message_count", 0)
+    return await load_range(db, session["session_id"], max(0, count - window), count - 1)
+
+
+async def load_page(db, session_id: str, before: Optional[int] = None, limit: int = BUCKET_SIZE) -> Tuple[List[Dict], Optional[int]]:
+    """
+    One page of a transcript, newest first by bucket. Pass the returned
+    cursor as before to get the page preceding it; the cursor is None once
+    the first bucket has been returned.
+    """
+    query = {"session_id": session_id}
+    if before is not None:
+        query["bucket"] = {"$lt": before}
+    bucket_count = max(1, -(-limit // BUCKET_SIZE))
+    buckets = await db.chat_messages.find(
+        query,
+        {"_id": 0, "bucket": 1, "messages": 1}
+    ).sort("bucket", DESCENDING).limit(bucket_count).to_list(bucket_count)
+    count_db_op()
+
+    buckets.reverse()
+    messages = sorted(
+        (message for bucket in buckets for message in bucket.get("messages", [])),
+        key=lambda message: message["seq"]
+    )
+    next_cursor = buckets[0]["bucket"] if buckets and buckets[0]["bucket"] > 0 else None
+    return messages, next_cursor
+
+
+async def set_message_feedback(db, session_id: str, seq: int, feedback_type: str) -> bool:
+    result = await db.chat_messages.update_one(
+        {"session_id": session_id, "bucket": bucket_of(seq), "messages.seq": seq},
+        {"$set": {"messages.$.feedback": feedback_type}}
+    )
+    count_db_op()
+    return result.matched_count > 0
+
+
+async def _write_legacy_buckets(db, session_id: str, messages: List[Dict]):
+    """
+    Store a legacy transcript in its buckets. Each bucket is inserted whole
+    with $setOnInsert, so running this again - after a crash, or in a
+    concurrent request - leaves existing buckets as they are.
+    """
+    now = datetime.utcnow()
+    numbered = [{**message, "seq": seq} for seq, message in enumerate(messages)]
+    operations = [
+        UpdateOne(
+            {"session_id": session_id, "bucket": bucket},
+            {"$setOnInsert": {"messages": list(group), "created_at": now, "updated_at": now}},
+            upsert=True
+        )
+        for bucket, group in groupby(numbered, key=lambda message: bucket_of(message["seq"]))
+    ]
+    if not operations:
+        return
+    try:
+        await db.chat_messages.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Two upserts of a new bucket can race on the unique index; the loser's retry is a no-op
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        await db.chat_messages.bulk_write(operations, ordered=False)
+    count_db_op()
+
+
+async def ensure_bucketed(db, session: Dict) -> Dict:
+    """
+    Move a legacy session's embedded messages into buckets. Returns the
+    session as it is stored afterwards - with message_count, without messages.
+    """
+    if "message_count" in session:
+        return session
+
+    messages = session.get("messages", [])
+    # Buckets first: the embedded copy is only dropped once they are stored
+    await _write_legacy_buckets(db, session["session_id"], messages)
+    result = await db.chat_sessions.update_one(
+        {"session_id": session["session_id"], "message_count": {"$exists": False}},
+        {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+    )
+    count_db_op()
+    if result.modified_count:
+        logger.info(f"Moved {len(messages)} messages of session {session['session_id']} into buckets")
+
+    migrated = {key: value for key, value in session.items() if key != "messages"}
+    migrated["message_count"] = len(messages)
+    return migrated
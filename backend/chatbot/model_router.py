@@ -0,0 +1,169 @@
+"""
+Intent-based model routing.
+
+Each LLM turn is matched against a small routing table on intent,
+conversation depth and how well the knowledge base covers the question,
+and the matching route picks a model tier. Simple exploring questions the
+knowledge base answers well go to the fast tier; problems, buying signals
+and everything unmatched stay on the large one.
+
+Latency, token and cost estimates are kept per route so the table can be
+tuned. Tiers can be overridden per route with MODEL_ROUTE_TIERS, e.g.
+"explore_kb=large,default=fast".
+"""
+import os
+import logging
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, FrozenSet, List, Optional
+from .text_utils import content_words, estimate_tokens
+from .llm_guard import PRIMARY_MODEL
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+LARGE = "large"
+
+TIER_MODELS = {
+    FAST: os.environ.get('LLM_FAST_MODEL', 'gpt-4o-mini'),
+    LARGE: os.environ.get('LLM_LARGE_MODEL', PRIMARY_MODEL)
+}
+
+# Share of the question's content words found in the assembled context
+STRONG_CONTEXT_COVERAGE = float(os.environ.get('MODEL_ROUTE_MIN_COVERAGE', '0.6'))
+LATENCY_WINDOW = 200
+
+# USD per 1M tokens (input, output); models not listed only count tokens
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60)
+}
+
+@dataclass
+class Route:
+    name: str
+    tier: str
+    intents: Optional[FrozenSet[str]] = None  # None matches any intent
+    max_depth: Optional[int] = None
+    strong_context: bool = False
+
+    def matches(self, intent: str, depth: int, strong: bool) -> bool:
+        return (
+            (self.intents is None or intent in self.intents) and
+            (self.max_depth is None or depth <= self.max_depth) and
+            (strong or not self.strong_context)
+        )
+
+
+# First match wins
+ROUTES = [
+    Route("convert", LARGE, intents=frozenset({"ready_to_convert"})),
+    Route("problem", LARGE, intents=frozenset({"specific_problem"})),
+    Route("explore_kb", FAST, intents=frozenset({"exploring"}), max_depth=6, strong_context=True),
+    Route("default", LARGE)
+]
+
+
+def context_coverage(question: str, context: str) -> float:
+    """Fraction of the question's content words that appear in the context"""
+    words = content_words(question)
+    if not words or not context:
+        return 0.0
+    return len(words & content_words(context)) / len(words)
+
+
+@dataclass
+class RouteStats:
+    calls: int = 0
+    failures: int = 0
+    models: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class ModelRouter:
+    def __init__(self, routes=ROUTES, tier_models: Dict[str, str] = TIER_MODELS):
+        # Copies - overrides must not leak into ROUTES and from there into other routers
+        self.routes = [replace(route) for route in routes]
+        self.tier_models = dict(tier_models)
+        self._apply_overrides(os.environ.get('MODEL_ROUTE_TIERS', ''))
+        self.stats: Dict[str, RouteStats] = {}
+
+    def _apply_overrides(self, spec: str):
+        for entry in filter(None, (part.strip() for part in spec.split(','))):
+            name, _, tier = entry.partition('=')
+            route = next((r for r in self.routes if r.name == name.strip()), None)
+            if route is None or tier.strip() not in self.tier_models:
+                logger.warning(f"Ignoring model route override: {entry}")
+                continue
+            route.tier = tier.strip()
+
+    def route(self, question: str, context: str, context_analysis: Dict) -> Route:
+        """Pick the route for an LLM turn"""
+        strong = context_coverage(question, context) >= STRONG_CONTEXT_COVERAGE
+        for route in self.routes:
+            if route.matches(context_analysis.get('intent', ''), context_analysis.get('conversation_depth', 0), strong):
+                return route
+        return self.routes[-1]
+
+    def model_for(self, route: Route) -> str:
+        return self.tier_models[route.tier]
+
+    def models(self) -> List[str]:
+        """Every model a routed turn can be sent to, as its model or its fallback"""
+        return sorted(set(self.tier_models.values()))
+
+    def fallback_for(self, route: Route) -> Optional[str]:
+        """The other tier - used for hedging and failover"""
+        other = LARGE if route.tier == FAST else FAST
+        return self.tier_models.get(other)
+
+    def record(self, route: Route, model: str, seconds: float, prompt: str, reply: Optional[str]):
+        """Record one routed call; reply is None when it failed"""
+        stats = self.stats.setdefault(route.name, RouteStats())
+        stats.calls += 1
+        stats.latencies.append(seconds)
+        if reply is None:
+            stats.failures += 1
+            return
+
+        stats.models[model] = stats.models.get(model, 0) + 1
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(reply)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        stats.cost_usd += (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    def get_stats(self) -> Dict:
+        routes = {}
+        for route in self.routes:
+            stats = self.stats.get(route.name, RouteStats())
+            p50 = stats.percentile(0.5)
+            p95 = stats.percentile(0.95)
+            succeeded = stats.calls - stats.failures
+            routes[route.name] = {
+                "tier": route.tier,
+                "model": self.model_for(route),
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "models_used": stats.models,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+                "est_cost_usd": round(stats.cost_usd, 4),
+                "est_cost_per_call_usd": round(stats.cost_usd / succeeded, 6) if succeeded else None
+            }
+        return {"tiers": self.tier_models, "routes": routes}
+
+# Global instance
+model_router = ModelRouter()
@@ -14,7 +14,9 @@ class ChatSession(BaseModel):
     user_name: Optional[str] = None
     user_email: Optional[str] = None
     user_phone: Optional[str] = None
-    messages: List[Dict[str, Any]] = []
+    message_count: int = 0  # messages themselves are bucketed in chat_messages
+    conversation_memory: Optional[Dict[str, Any]] = None  # see chatbot.conversation_memory
+    conversation_summary: Optional[Dict[str, Any]] = None  # see chatbot.conversation_context
     query_topics: List[str] = []
     answered_questions: List[str] = []
     unanswered_questions: List[str] = []
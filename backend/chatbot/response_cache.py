@@ -0,0 +1,78 @@
+"""
+In-process cache of LLM replies for repeat questions.
+
+Keys combine the normalized question with the detected intent, sentiment
+and knowledge base version - everything that shapes the prompt when no
+personal details are in play - so a knowledge base update retires old
+answers automatically. Entries expire after a TTL and the least recently
+used ones are evicted beyond the size limit.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1000'))
+CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return ' '.join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(question: str, intent: str, sentiment: str, kb_version: int) -> Tuple:
+        return (normalize_question(question), intent, sentiment, kb_version)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,105 @@
+"""
+In-process cache of active chat sessions.
+
+Keeps each recently active session's document (contact details, counters)
+and its last few messages, so a visitor's next message does not have to
+read them back from Mongo. Entries are updated in place when a turn is
+stored; the write itself still completes before the response is sent, so
+nothing is acknowledged that is not durable.
+
+Turns for one session run under that session's asyncio.Lock and are applied
+in arrival order. Another worker process may still write the same session:
+the turn's session update only matches the message_count this cache saw,
+and a miss drops the entry so the next turn reloads it.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1000'))
+CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '600'))
+
+
+class SessionCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # session_id -> (expires_at, session, recent messages)
+        self._entries: "OrderedDict[str, Tuple[float, Dict, List[Dict]]]" = OrderedDict()
+        # session_id -> [lock, holders]; dropped when nobody holds or waits for it
+        self._locks: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.conflicts = 0
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """Serialize turns of one session"""
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def get(self, session_id: str) -> Optional[Tuple[Dict, List[Dict]]]:
+        """(session, recent messages) or None"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[session_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return dict(entry[1]), list(entry[2])
+
+    def put(self, session_id: str, session: Dict, history: List[Dict], window: int):
+        self._entries[session_id] = (time.monotonic() + self.ttl, dict(session), list(history[-window:]))
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, session_id: str, fields: Dict):
+        """Patch a cached session in place, keeping its position and expiry"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry[1].update(fields)
+
+    def invalidate(self, session_id: str, conflict: bool = False):
+        self._entries.pop(session_id, None)
+        if conflict:
+            self.conflicts += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "conflicts": self.conflicts,
+            "locked_sessions": len(self._locks)
+        }
+
+# Global instance
+session_cache = SessionCache()
@@ -34,7 +34,7 @@ class SheetsService:
                 ', '.join(session_data.get('query_topics', [])),
                 ', '.join(session_data.get('answered_questions', [])),
                 ', '.join(session_data.get('unanswered_questions', [])),
-                str(len(session_data.get('messages', []))),
+                str(session_data.get('message_count', len(session_data.get('messages', [])))),
                 session_data.get('session_id', '')
             ]
             
@@ -0,0 +1,24 @@
+"""
+Text helpers shared by retrieval, routing and answering: a cheap token
+estimate for prompt budgets and the content-word tokenizer used to compare
+questions with knowledge base text.
+"""
+import re
+
+# Rough OpenAI-tokenizer ratio for English text; avoids loading a BPE table per worker
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = frozenset("""
+a about an and any are as at be but by can could do does explain for from have
+how i if in is it just know like me more my need of on or our please should so
+tell that the their them there these they this to us want was we what when
+where which who why will with would you your
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+def content_words(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2 and word not in STOPWORDS}
@@ -0,0 +1,56 @@
+"""
+Per-turn database operation counter.
+
+A chat turn runs inside track_turn(); every Mongo call made on its behalf
+calls count_db_op(). The counter lives in a context variable, so work done
+in the turn's task - including the AI service - is attributed to it while
+background tasks are not.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+_current_turn: ContextVar[Optional[List[int]]] = ContextVar('current_turn_db_ops', default=None)
+
+
+def count_db_op(count: int = 1):
+    """Attribute Mongo operations to the turn being processed, if any"""
+    ops = _current_turn.get()
+    if ops is not None:
+        ops[0] += count
+
+
+class TurnDbOps:
+    def __init__(self):
+        self.turns = 0
+        self.total_ops = 0
+        self.max_ops = 0
+        self.last_ops = 0
+        self.histogram = Counter()  # ops per turn -> turns
+
+    @contextmanager
+    def track_turn(self):
+        ops = [0]
+        token = _current_turn.set(ops)
+        try:
+            yield ops
+        finally:
+            _current_turn.reset(token)
+            self.turns += 1
+            self.total_ops += ops[0]
+            self.max_ops = max(self.max_ops, ops[0])
+            self.last_ops = ops[0]
+            self.histogram[ops[0]] += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "turns": self.turns,
+            "avg_ops_per_turn": round(self.total_ops / self.turns, 2) if self.turns else 0.0,
+            "max_ops_per_turn": self.max_ops,
+            "last_turn_ops": self.last_ops,
+            "ops_per_turn_histogram": dict(sorted(self.histogram.items()))
+        }
+
+# Global instance
+turn_db_ops = TurnDbOps()
@@ -0,0 +1,105 @@
+"""
+Write-behind buffer for approved-answer usage counts.
+
+Chat requests only bump an in-memory counter; a background task flushes the
+accumulated increments with one unordered bulk_write every few seconds, and
+once more on shutdown. Counts are per worker process until flushed.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_SECONDS', '10'))
+
+
+class UsageCounterBuffer:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.pending = Counter()  # answer id -> increments not yet written
+        self.flushed_total = 0
+        self.failed_flushes = 0
+        self.last_flush_at: Optional[float] = None
+        self._db = None
+        self._task = None
+
+    def increment(self, answer_id: str, count: int = 1):
+        self.pending[answer_id] += count
+
+    def start(self, db):
+        """Start the periodic flush - called from the server startup hook"""
+        self._db = db
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write pending increments, returns the number of answers updated"""
+        if not self.pending or self._db is None:
+            return 0
+
+        # Swap before awaiting so increments arriving mid-flush go to the next batch
+        batch, self.pending = self.pending, Counter()
+        answer_ids = list(batch)
+        operations = [
+            UpdateOne({"id": answer_id}, {"$inc": {"usage_count": batch[answer_id]}})
+            for answer_id in answer_ids
+        ]
+        try:
+            await self._db.approved_answers.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every operation not listed as failed was applied - re-queuing it would count it twice
+            failed = Counter({
+                answer_ids[error["index"]]: batch[answer_ids[error["index"]]]
+                for error in e.details.get("writeErrors", [])
+            })
+            self.pending.update(failed)
+            self.failed_flushes += 1
+            logger.warning(f"Failed to flush usage counts of {len(failed)} answers: {e}")
+            self.flushed_total += sum(batch.values()) - sum(failed.values())
+            self.last_flush_at = time.time()
+            return len(batch) - len(failed)
+        except Exception as e:
+            # Keep the counts for the next attempt
+            self.pending.update(batch)
+            self.failed_flushes += 1
+            logger.warning(f"Failed to flush usage counts: {e}")
+            return 0
+
+        self.flushed_total += sum(batch.values())
+        self.last_flush_at = time.time()
+        return len(batch)
+
+    def get_stats(self) -> Dict:
+        return {
+            "pending": dict(self.pending),
+            "pending_total": sum(self.pending.values()),
+            "flushed_total": self.flushed_total,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_at": self.last_flush_at,
+            "flush_interval_seconds": self.flush_interval
+        }
+
+# Global instance
+usage_counters = UsageCounterBuffer()
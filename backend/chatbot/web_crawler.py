@@ -0,0 +1,175 @@
+"""
+Incremental website crawler for the knowledge base.
+
+Pages are discovered from the SEO sitemap (/api/seo/sitemap) and fetched
+concurrently over one pooled HTTP client. Each page's ETag, Last-Modified
+and content hash are remembered in a small JSON state file, so a recrawl
+sends conditional GETs and only re-chunks pages whose text changed. Pages
+that drop out of the sitemap (or return 404/410) have their chunks removed.
+"""
+import os
+import json
+import hashlib
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Tuple
+import httpx
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Used when the sitemap endpoint is unreachable
+DEFAULT_PAGES = ["/", "/about", "/services", "/products"]
+
+
+def html_to_text(content: bytes) -> str:
+    """Extract readable text from an HTML page"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def page_doc_id(page_url: str) -> str:
+    return hashlib.md5(page_url.encode()).hexdigest()[:12]
+
+
+class WebsiteCrawler:
+    def __init__(self, knowledge_base, state_path: str):
+        self.knowledge_base = knowledge_base
+        self.state_path = state_path
+        self.concurrency = int(os.environ.get('KB_CRAWL_CONCURRENCY', '4'))
+        self.timeout = float(os.environ.get('KB_CRAWL_TIMEOUT_SECONDS', '10'))
+        # page url -> {doc_id, etag, last_modified, content_hash}
+        self.pages = self._load_state()
+
+    def _load_state(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable crawl state: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.pages, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.error(f"Error saving crawl state: {e}")
+
+    async def crawl(self, base_url: str) -> Dict[str, int]:
+        """Crawl the site once, returns a count of pages per outcome"""
+        base_url = base_url.rstrip('/')
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+            urls, from_sitemap = await self.discover(client, base_url)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            outcomes = await asyncio.gather(*(self._crawl_page(client, semaphore, url) for url in urls))
+
+        stats = Counter(outcomes)
+
+        # The fallback list is not authoritative, so only a real sitemap retires pages
+        if from_sitemap:
+            current = set(urls)
+            for url in [url for url in self.pages if url.startswith(base_url) and url not in current]:
+                await self._remove_page(url)
+                stats['removed'] += 1
+
+        self._save_state()
+        return dict(stats)
+
+    async def discover(self, client: httpx.AsyncClient, base_url: str) -> Tuple[List[str], bool]:
+        """Get page urls from the sitemap, falling back to the default pages"""
+        try:
+            response = await client.get(f"{base_url}/api/seo/sitemap")
+            response.raise_for_status()
+            entries = response.json().get("entries") or []
+            urls = [self._absolute(base_url, entry["url"]) for entry in entries if entry.get("url")]
+            if urls:
+                return list(dict.fromkeys(urls)), True
+        except Exception as e:
+            logger.warning(f"Sitemap unavailable, crawling default pages: {e}")
+
+        return [self._absolute(base_url, path) for path in DEFAULT_PAGES], False
+
+    @staticmethod
+    def _absolute(base_url: str, url: str) -> str:
+        if url.startswith(("http://", "https://")):
+            return url
+        return f"{base_url}/{url.lstrip('/')}"
+
+    def _is_indexed(self, doc_id: str) -> bool:
+        # Validators are only trusted while the chunks they describe still exist
+        return bool(self.knowledge_base.store.ids_with_prefix(f"{doc_id}_chunk_"))
+
+    async def _crawl_page(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str) -> str:
+        doc_id = page_doc_id(url)
+        state = self.pages.get(url) if self._is_indexed(doc_id) else None
+
+        headers = {}
+        if state and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state and state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        async with semaphore:
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                logger.error(f"Error crawling {url}: {e}")
+                return 'failed'
+
+        if response.status_code == 304:
+            return 'not_modified'
+
+        if response.status_code in (404, 410):
+            if url in self.pages:
+                await self._remove_page(url)
+                return 'removed'
+            return 'failed'
+
+        if response.status_code != 200:
+            logger.error(f"Error crawling {url}: HTTP {response.status_code}")
+            return 'failed'
+
+        # Parsing and indexing are CPU-bound, keep them off the event loop
+        text = await asyncio.to_thread(html_to_text, response.content)
+        content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+        outcome = 'unchanged'
+        if not state or state.get("content_hash") != content_hash:
+            await asyncio.to_thread(
+                self.knowledge_base.add_document,
+                doc_id,
+                text,
+                {"source": url, "type": "webpage"}
+            )
+            outcome = 'updated'
+            logger.info(f"Crawled and added: {url}")
+
+        self.pages[url] = {
+            "doc_id": doc_id,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "content_hash": content_hash
+        }
+        return outcome
+
+    async def _remove_page(self, url: str):
+        state = self.pages.pop(url, None)
+        doc_id = state["doc_id"] if state else page_doc_id(url)
+        await asyncio.to_thread(self.knowledge_base.remove_document, doc_id)
+        logger.info(f"Removed page no longer on the site: {url}")
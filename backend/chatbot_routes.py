@@ -1,10 +1,29 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from chatbot.models import ChatRequest, ChatResponse, ChatSession
 from chatbot.knowledge_base import knowledge_base
 from chatbot.sheets_service import sheets_service
+from chatbot.response_cache import response_cache
+from chatbot.usage_counters import usage_counters
+from chatbot.llm_client import llm_client
+from chatbot.llm_guard import llm_guard
+from chatbot.model_router import model_router
+from chatbot.extractive_answerer import extractive_answerer
+from chatbot.admission import AdmissionRejected, admission
+from chatbot.turn_metrics import count_db_op, turn_db_ops
+from chatbot.message_store import HOT_WINDOW, append_messages, ensure_bucketed, load_page, load_recent
+from chatbot.session_cache import session_cache
+from chatbot.conversation_memory import build_memory, update_memory
+from chatbot.conversation_context import conversation_context_builder
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import json
+import asyncio
+import hashlib
+import tempfile
 import logging
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import re
 from dotenv import load_dotenv
@@ -34,25 +53,60 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ.get('DB_NAME', 'zentiam_db')]
 
+# Upload limits
+MAX_UPLOAD_MB = int(os.environ.get('KB_MAX_UPLOAD_MB', '25'))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# Session fields holding the visitor's contact details
+CONTACT_FIELDS = {"name": "user_name", "email": "user_email", "phone": "user_phone"}
+
+# Messages per admin transcript page
+TRANSCRIPT_PAGE_SIZE = int(os.environ.get('CHAT_TRANSCRIPT_PAGE_SIZE', '200'))
+
 @router.post("/init")
 async def initialize_chatbot():
-    """Initialize chatbot and crawl website"""
+    """Initialize chatbot and warm up the knowledge base in the background"""
     try:
         # Crawl the frontend website
         frontend_url = os.environ.get('REACT_APP_BACKEND_URL', '').replace('/api', '')
         if not frontend_url:
             frontend_url = "http://localhost:3000"
         
-        success = knowledge_base.crawl_website(frontend_url)
+        # Never block the widget on a crawl - at most one runs per interval
+        crawl_started = knowledge_base.schedule_crawl(frontend_url)
         
         return {
-            "success": success,
-            "message": "Chatbot initialized and website crawled" if success else "Failed to crawl website"
+            "success": True,
+            "message": "Knowledge base warm-up started" if crawl_started else "Chatbot initialized",
+            **knowledge_base.get_status()
         }
     except Exception as e:
         logger.error(f"Error initializing chatbot: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/status")
+async def get_chatbot_status():
+    """Get knowledge base readiness without triggering a crawl"""
+    return knowledge_base.get_status()
+
+@router.get("/metrics")
+async def get_chatbot_metrics():
+    """Get performance counters of the chatbot components in this worker"""
+    return {
+        "knowledge_base": {**knowledge_base.get_status(), **knowledge_base.get_stats()},
+        "response_cache": response_cache.get_stats(),
+        "usage_counters": usage_counters.get_stats(),
+        "llm_client": llm_client.get_stats(),
+        "llm_guard": llm_guard.get_stats(),
+        "model_router": model_router.get_stats(),
+        "extractive_answerer": extractive_answerer.get_stats(),
+        "admission": admission.get_stats(),
+        "turn_db_ops": turn_db_ops.get_stats(),
+        "session_cache": session_cache.get_stats(),
+        "conversation_context": conversation_context_builder.get_stats()
+    }
+
 @router.post("/session")
 async def create_session():
     """Create a new chat session"""
@@ -64,135 +118,247 @@ async def create_session():
         logger.error(f"Error creating session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Process chat message"""
-    try:
-        # Get session
-        session = await db.chat_sessions.find_one({"session_id": request.session_id})
+async def prepare_turn(session_id: str, message: str) -> Tuple[Dict, List[Dict], Dict, Dict, bool, Dict]:
+    """
+    Load the session with its most recent messages and conversation memory
+    and pick up contact details from the message. Nothing is written yet -
+    finish_turn stores the turn. The memory covers the earlier turns only;
+    the message is folded in once it has been answered. Returns
+    (session, history, memory, user_info, show_closure, session_updates).
+    """
+    # Active sessions are served from the session cache
+    cached = session_cache.get(session_id)
+    if cached:
+        session, history = cached
+    else:
+        session = await db.chat_sessions.find_one({"session_id": session_id})
+        count_db_op()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Extract user info from message if present
-        user_info = {
-            "name": session.get("user_name"),
-            "email": session.get("user_email"),
-            "phone": session.get("user_phone")
-        }
-        
-        # Get the last bot message for context (to check if bot asked for name)
-        messages = session.get("messages", [])
-        last_bot_message = ""
-        for msg in reversed(messages):
-            if msg.get("sender") == "bot":
-                last_bot_message = msg.get("message", "")
-                break
-        
-        # Extract user info BEFORE generating response (with context awareness)
-        extracted_info = extract_user_info(request.message, user_info, last_bot_message)
-        
-        # Track what was just extracted
-        just_got_name = "name" in extracted_info
-        just_got_email = "email" in extracted_info
-        just_got_phone = "phone" in extracted_info
-        
-        if extracted_info:
-            user_info.update(extracted_info)
-            # Update session
-            await db.chat_sessions.update_one(
-                {"session_id": request.session_id},
-                {
-                    "$set": {
-                        "user_name": user_info.get("name"),
-                        "user_email": user_info.get("email"),
-                        "user_phone": user_info.get("phone"),
-                        "info_collected": all([user_info.get("name"), user_info.get("email"), user_info.get("phone")]),
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-        
-        # Check if user is declining to provide phone
-        decline_phrases = [
-            "don't want to", "dont want to", "no thanks", "skip", 
-            "i'd rather not", "id rather not", "prefer not to",
-            "not share", "not comfortable", "pass on that", "no phone",
-            "rather not", "don't have", "dont have", "no number"
-        ]
-        message_lower = request.message.lower()
-        is_declining_phone = any(phrase in message_lower for phrase in decline_phrases)
-        
-        # If user declined phone but we have name + email, trigger closure
-        if is_declining_phone and user_info.get("name") and user_info.get("email") and not user_info.get("phone"):
-            # Mark phone as skipped IMMEDIATELY and update user_info
-            user_info["phone"] = "skipped"
-            await db.chat_sessions.update_one(
-                {"session_id": request.session_id},
-                {
-                    "$set": {
-                        "user_phone": "skipped",
-                        "info_collected": True,
-                        "info_collected_flow_complete": True,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
+        session = await ensure_bucketed(db, session)
+        history = await load_recent(db, session)
+    
+    # A missing or out of date memory is rebuilt from the loaded window
+    memory = session.get("conversation_memory")
+    if not memory or memory.get("messages_seen") != session["message_count"]:
+        memory = build_memory(history, session["message_count"])
+    
+    # Extract user info from message if present
+    user_info = {
+        "name": session.get("user_name"),
+        "email": session.get("user_email"),
+        "phone": session.get("user_phone")
+    }
+    
+    # Get the last bot message for context (to check if bot asked for name)
+    last_bot_message = ""
+    for msg in reversed(history):
+        if msg.get("sender") == "bot":
+            last_bot_message = msg.get("message", "")
+            break
+    
+    # Extract user info BEFORE generating response (with context awareness)
+    extracted_info = extract_user_info(message, user_info, last_bot_message)
+    
+    # Track what was just extracted
+    just_got_name = "name" in extracted_info
+    just_got_email = "email" in extracted_info
+    just_got_phone = "phone" in extracted_info
+    
+    session_updates = {}
+    if extracted_info:
+        user_info.update(extracted_info)
+        # Only the details found in this message - the others are stored already
+        session_updates.update({CONTACT_FIELDS[key]: value for key, value in extracted_info.items()})
+        session_updates["info_collected"] = all([user_info.get("name"), user_info.get("email"), user_info.get("phone")])
+    
+    # Check if user is declining to provide phone
+    decline_phrases = [
+        "don't want to", "dont want to", "no thanks", "skip", 
+        "i'd rather not", "id rather not", "prefer not to",
+        "not share", "not comfortable", "pass on that", "no phone",
+        "rather not", "don't have", "dont have", "no number"
+    ]
+    message_lower = message.lower()
+    is_declining_phone = any(phrase in message_lower for phrase in decline_phrases)
+    
+    # If user declined phone but we have name + email, trigger closure
+    if is_declining_phone and user_info.get("name") and user_info.get("email") and not user_info.get("phone"):
+        # Mark phone as skipped IMMEDIATELY and update user_info
+        user_info["phone"] = "skipped"
+        session_updates.update({
+            "user_phone": "skipped",
+            "info_collected": True,
+            "info_collected_flow_complete": True
+        })
+        show_closure = True
+    else:
+        # Check if we just completed info collection (got phone and have name + email)
+        show_closure = (just_got_phone and user_info.get("name") and user_info.get("email"))
+    
+    return session, history, memory, user_info, show_closure, session_updates
+
+async def finish_turn(
+    session_id: str,
+    message: str,
+    session: Dict,
+    history: List[Dict],
+    user_info: Dict,
+    session_updates: Dict,
+    response_data: Dict,
+    received_at: datetime
+) -> Tuple[Dict, List[Dict]]:
+    """
+    Store the turn: one session update for contact details, question
+    tracking and the message count, then both messages in their bucket.
+    Completed leads are logged from the updated session document, which
+    also replaces the session's cache entry. Awaited before the reply is
+    sent, so a delivered answer is always stored. Returns the updated
+    session and the latest messages including this turn's.
+    """
+    update = {
+        "$set": {**session_updates, "updated_at": datetime.utcnow()},
+        # Reserves the sequence numbers of the two messages
+        "$inc": {"message_count": 2}
+    }
+    
+    # Track answered/unanswered questions
+    if "?" in message:
+        field = "answered_questions" if response_data.get("is_answered") else "unanswered_questions"
+        update["$push"] = {field: message}
+    
+    try:
+        # Only matches if nobody else stored a turn since the session was read
+        session_updated = await db.chat_sessions.find_one_and_update(
+            {"session_id": session_id, "message_count": session["message_count"]},
+            update,
+            return_document=ReturnDocument.AFTER
+        )
+        count_db_op()
+        conflict = session_updated is None
+        if conflict:
+            # Another worker wrote this session - store the turn anyway and reload next time
+            logger.info(f"Session {session_id} changed elsewhere, dropping its cache entry")
+            session_cache.invalidate(session_id, conflict=True)
+            update["$set"] = await conflict_updates(session_id, update["$set"])
+            session_updated = await db.chat_sessions.find_one_and_update(
+                {"session_id": session_id},
+                update,
+                return_document=ReturnDocument.AFTER
             )
-            show_closure = True
-        else:
-            # Check if we just completed info collection (got phone and have name + email)
-            show_closure = (just_got_phone and user_info.get("name") and user_info.get("email"))
+            count_db_op()
         
-        # Add user message to session
-        await db.chat_sessions.update_one(
-            {"session_id": request.session_id},
+        new_messages = [
             {
-                "$push": {
-                    "messages": {
-                        "sender": "user",
-                        "message": request.message,
-                        "timestamp": datetime.utcnow()
-                    }
-                },
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        
-        # Generate AI response
-        response_data = await ai_service.generate_response(
-            session_id=request.session_id,
-            user_message=request.message,
-            user_info=user_info,
-            conversation_history=session.get("messages", []),
-            show_closure=show_closure
-        )
-        
-        # Add bot response to session
-        await db.chat_sessions.update_one(
-            {"session_id": request.session_id},
+                "sender": "user",
+                "message": message,
+                "timestamp": received_at
+            },
             {
-                "$push": {
-                    "messages": {
-                        "sender": "bot",
-                        "message": response_data["response"],
-                        "timestamp": datetime.utcnow()
-                    }
-                },
-                "$set": {"updated_at": datetime.utcnow()}
+                "sender": "bot",
+                "message": response_data["response"],
+                "timestamp": datetime.utcnow()
             }
-        )
-        
-        # Track answered/unanswered questions
-        if "?" in request.message:
-            field = "answered_questions" if response_data.get("is_answered") else "unanswered_questions"
-            await db.chat_sessions.update_one(
-                {"session_id": request.session_id},
-                {"$push": {field: request.message}}
+        ]
+        first_seq = session_updated["message_count"] - 2
+        await append_messages(db, session_id, first_seq, new_messages)
+    except Exception:
+        session_cache.invalidate(session_id)
+        raise
+    
+    numbered = [{**msg, "seq": first_seq + i} for i, msg in enumerate(new_messages)]
+    if not conflict:
+        session_cache.put(session_id, session_updated, history + numbered, HOT_WINDOW)
+    
+    # Log to Google Sheets if info is collected
+    if user_info.get("name") and user_info.get("email"):
+        sheets_service.log_conversation(session_updated)
+    
+    return session_updated, history + numbered
+
+async def conflict_updates(session_id: str, updates: Dict) -> Dict:
+    """
+    The $set of a turn whose session snapshot turned out stale: only the
+    contact details this message supplied, with info_collected recomputed
+    from the stored session. The conversation memory is left out - its
+    messages_seen no longer matches, so the next turn rebuilds it.
+    """
+    kept = {
+        key: value for key, value in updates.items()
+        if key in CONTACT_FIELDS.values() or key in ("updated_at", "info_collected_flow_complete")
+    }
+    if any(field in kept for field in CONTACT_FIELDS.values()):
+        stored = await db.chat_sessions.find_one(
+            {"session_id": session_id},
+            {"_id": 0, **{field: 1 for field in CONTACT_FIELDS.values()}}
+        ) or {}
+        count_db_op()
+        kept["info_collected"] = all(kept.get(field, stored.get(field)) for field in CONTACT_FIELDS.values())
+    return kept
+
+async def run_turn(
+    session_id: str,
+    message: str,
+    on_prepared: Optional[Callable[[], None]] = None,
+    token_sink: Optional[Callable[[str], None]] = None
+) -> Dict:
+    """
+    Answer one chat message end to end, returns the AI service response.
+    Turns of one session run one at a time, in the order they arrived.
+    """
+    async with session_cache.lock(session_id):
+        with turn_db_ops.track_turn():
+            received_at = datetime.utcnow()
+            session, history, memory, user_info, show_closure, session_updates = await prepare_turn(session_id, message)
+            if on_prepared:
+                on_prepared()
+            
+            # The basic service has no streaming support, conversation depth, memory or summary
+            kwargs = {}
+            if USE_ENHANCED:
+                kwargs["total_messages"] = session["message_count"]
+                kwargs["conversation_memory"] = memory
+                kwargs["conversation_summary"] = session.get("conversation_summary")
+                if token_sink:
+                    kwargs["token_sink"] = token_sink
+            response_data = await ai_service.generate_response(
+                session_id=session_id,
+                user_message=message,
+                user_info=user_info,
+                conversation_history=history,
+                show_closure=show_closure,
+                **kwargs
             )
-        
-        # Log to Google Sheets if info is collected
-        if user_info.get("name") and user_info.get("email"):
-            session_updated = await db.chat_sessions.find_one({"session_id": request.session_id})
-            sheets_service.log_conversation(session_updated)
+            
+            # Only the new message is scanned - after the reply, which must see the earlier turns only
+            session_updates["conversation_memory"] = update_memory(memory, message, session["message_count"] + 2)
+            session_updated, recent = await finish_turn(
+                session_id, message, session, history, user_info, session_updates, response_data, received_at
+            )
+    
+    # Summarizing older turns is not part of this turn - started outside its op tracking
+    if USE_ENHANCED:
+        conversation_context_builder.schedule_refresh(db, session_updated, recent)
+    return response_data
+
+def turn_key(session_id: str, message: str) -> Tuple[str, str]:
+    """Coalescing key - a resent message for the same session shares the first answer"""
+    return session_id, ' '.join(message.lower().split())
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    detail = "Chat is busy right now, please retry shortly" if e.status_code == 429 else "Chat is temporarily overloaded, please retry shortly"
+    return HTTPException(status_code=e.status_code, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """Process chat message"""
+    try:
+        task, _ = admission.coalesce(
+            turn_key(request.session_id, request.message),
+            lambda: run_turn(request.session_id, request.message)
+        )
+        # Shielded: a duplicate request or a client disconnect must not cancel the shared turn
+        response_data = await asyncio.shield(task)
         
         return ChatResponse(
             session_id=request.session_id,
@@ -202,31 +368,148 @@ async def chat(request: ChatRequest):
             used_approved_answer=response_data.get("used_approved_answer", False)
         )
         
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         logger.error(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(payload: Dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process chat message, streaming the reply as Server-Sent Events.
+    
+    Emits {"type": "token"} events while the reply is generated and a final
+    {"type": "done"} event carrying the complete response and the same fields
+    as /chat. Templated and cached replies arrive as a single token event, as
+    does the reply to a resent message that joined an earlier turn. If the
+    final reply does not continue the streamed text - the LLM failed part way
+    and a fallback answer was used - a {"type": "reset"} event tells the
+    client to discard what it has shown, and the whole reply follows.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    prepared = asyncio.Event()
+    task, joined = admission.coalesce(
+        turn_key(request.session_id, request.message),
+        lambda: run_turn(request.session_id, request.message, prepared.set, queue.put_nowait)
+    )
+    
+    if not joined:
+        # Tokens stop when the turn ends, however it ends
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        # Report a missing session as a plain error response before the stream starts
+        waiter = asyncio.ensure_future(prepared.wait())
+        await asyncio.wait({waiter, task}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if task.done() and task.exception() is not None:
+            e = task.exception()
+            if isinstance(e, HTTPException):
+                raise e
+            if isinstance(e, AdmissionRejected):
+                raise admission_error(e)
+            logger.error(f"Error in chat stream: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        streamed = []
+        if not joined:
+            while True:
+                token = await queue.get()
+                if token is None:
+                    break
+                streamed.append(token)
+                yield sse_event({"type": "token", "text": token})
+        
+        try:
+            response_data = await asyncio.shield(task)
+        except AdmissionRejected as e:
+            yield sse_event({"type": "error", "status": e.status_code, "retry_after": e.retry_after, "detail": e.reason})
+            return
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            yield sse_event({"type": "error", "status": 500, "detail": str(e)})
+            return
+        
+        # Send whatever the tokens did not cover: the whole reply for templated
+        # or cached answers, or text appended after generation (info prompts)
+        response = response_data["response"]
+        sent = "".join(streamed)
+        if response.startswith(sent):
+            remainder = response[len(sent):]
+        else:
+            yield sse_event({"type": "reset"})
+            remainder = response
+        if remainder:
+            yield sse_event({"type": "token", "text": remainder})
+        
+        yield sse_event({
+            "type": "done",
+            "session_id": request.session_id,
+            "response": response,
+            "needs_info": response_data.get("needs_info", False),
+            "info_type": response_data.get("info_type"),
+            "used_approved_answer": response_data.get("used_approved_answer", False)
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def spool_upload(file: UploadFile, suffix: str) -> Tuple[str, str]:
+    """Stream an upload to a temp file, hashing it and enforcing the size cap"""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_MB} MB upload limit")
+    
+    digest = hashlib.sha256()
+    size = 0
+    # On disk rather than in memory: the parser pool opens the file by path
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        while True:
+            block = await file.read(UPLOAD_READ_SIZE)
+            if not block:
+                break
+            size += len(block)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_MB} MB upload limit")
+            digest.update(block)
+            await asyncio.to_thread(tmp.write, block)
+        tmp.close()
+        return tmp.name, digest.hexdigest()
+    except BaseException:
+        tmp.close()
+        os.unlink(tmp.name)
+        raise
+
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     """Upload document to knowledge base"""
     try:
-        content = await file.read()
-        
-        if file.filename.endswith('.pdf'):
-            success = knowledge_base.add_pdf(content, file.filename)
-        elif file.filename.endswith('.pptx'):
-            success = knowledge_base.add_pptx(content, file.filename)
-        elif file.filename.endswith('.txt'):
-            text = content.decode('utf-8')
-            success = knowledge_base.add_document(f"txt_{file.filename}", text, {"source": "upload", "filename": file.filename})
-        else:
+        suffix = os.path.splitext(file.filename or "")[1].lower()
+        if suffix not in ('.pdf', '.pptx', '.txt'):
             raise HTTPException(status_code=400, detail="Unsupported file type")
         
-        if success:
-            return {"message": f"Document {file.filename} uploaded successfully"}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to process document")
+        path, file_hash = await spool_upload(file, suffix)
+        try:
+            # Text uploads keep their original document id
+            doc_id = f"txt_{file.filename}" if suffix == '.txt' else None
+            result = await knowledge_base.ingest_file(path, file.filename, suffix[1:], file_hash, doc_id)
+        finally:
+            os.unlink(path)
+        
+        if result["status"] == "unchanged":
+            return {"message": f"Document {file.filename} is already up to date", **result}
+        return {"message": f"Document {file.filename} uploaded successfully", **result}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -237,8 +520,8 @@ async def get_sessions(limit: int = 50):
     try:
         # Only get sessions that have at least one message - with field projection for performance
         sessions = await db.chat_sessions.find(
-            {"messages.0": {"$exists": True}},
-            {"_id": 0, "session_id": 1, "user_name": 1, "user_email": 1, "user_phone": 1, "created_at": 1, "updated_at": 1, "info_collected": 1}
+            {"$or": [{"message_count": {"$gt": 0}}, {"messages.0": {"$exists": True}}]},
+            {"_id": 0, "session_id": 1, "user_name": 1, "user_email": 1, "user_phone": 1, "created_at": 1, "updated_at": 1, "info_collected": 1, "message_count": 1}
         ).sort("created_at", -1).limit(limit).to_list(limit)
         return {"sessions": sessions}
     except Exception as e:
@@ -247,19 +530,42 @@ async def get_sessions(limit: int = 50):
 
 @router.get("/session/{session_id}")
 async def get_session(session_id: str):
-    """Get specific session details"""
+    """Get specific session details with the most recent page of its transcript"""
     try:
-        session = await db.chat_sessions.find_one(
-            {"session_id": session_id},
-            {"_id": 0}
-        )
+        session = await db.chat_sessions.find_one({"session_id": session_id})
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return session
+        session = await ensure_bucketed(db, session)
+        session.pop("_id", None)
+        
+        messages, next_cursor = await load_page(db, session_id, limit=TRANSCRIPT_PAGE_SIZE)
+        return {**session, "messages": messages, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/session/{session_id}/messages")
+async def get_session_messages(session_id: str, cursor: Optional[int] = None, limit: int = TRANSCRIPT_PAGE_SIZE):
+    """
+    Page backwards through a transcript. Without a cursor the newest page is
+    returned; pass next_cursor from a response to get the page before it.
+    """
+    try:
+        session = await db.chat_sessions.find_one({"session_id": session_id})
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        await ensure_bucketed(db, session)
+        
+        messages, next_cursor = await load_page(db, session_id, before=cursor, limit=limit)
+        return {"messages": messages, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting session messages: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 def extract_user_info(message: str, current_info: dict, last_bot_message: str = "") -> dict:
     """
     Extract user information from message with context awareness.
@@ -6,6 +6,9 @@ import os
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from uuid import uuid4
+from chatbot.cache_versions import bump_version, APPROVED_ANSWERS
+from chatbot.usage_counters import usage_counters
+from chatbot.message_store import ensure_bucketed, load_range, set_message_feedback
 
 logger = logging.getLogger(__name__)
 
@@ -45,14 +48,18 @@ async def submit_feedback(feedback: FeedbackRequest):
         session = await db.chat_sessions.find_one({"session_id": feedback.session_id})
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        session = await ensure_bucketed(db, session)
         
-        messages = session.get("messages", [])
-        if feedback.message_index >= len(messages):
+        if feedback.message_index < 0 or feedback.message_index >= session["message_count"]:
             raise HTTPException(status_code=400, detail="Invalid message index")
         
-        # Get the bot message and preceding user message
+        # Get the bot message and preceding user message - at most two buckets
+        pair = await load_range(db, feedback.session_id, max(0, feedback.message_index - 1), feedback.message_index)
+        messages = {message["seq"]: message for message in pair}
+        if feedback.message_index not in messages:
+            raise HTTPException(status_code=400, detail="Invalid message index")
         bot_message = messages[feedback.message_index]
-        user_message = messages[feedback.message_index - 1] if feedback.message_index > 0 else None
+        user_message = messages.get(feedback.message_index - 1)
         
         # Create feedback record
         feedback_record = {
@@ -68,11 +75,11 @@ async def submit_feedback(feedback: FeedbackRequest):
         
         await db.feedback.insert_one(feedback_record)
         
-        # Update session with feedback info
+        # Update the message and the session's feedback counters
+        await set_message_feedback(db, feedback.session_id, feedback.message_index, feedback.feedback_type)
         await db.chat_sessions.update_one(
             {"session_id": feedback.session_id},
             {
-                "$set": {f"messages.{feedback.message_index}.feedback": feedback.feedback_type},
                 "$inc": {
                     "positive_feedback_count" if feedback.feedback_type == "positive" else "negative_feedback_count": 1
                 }
@@ -132,6 +139,11 @@ async def get_approved_answers(skip: int = 0, limit: int = 50):
         logger.error(f"Error getting approved answers: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/admin/approved-answers/pending-usage")
+async def get_pending_usage():
+    """Get usage counts buffered in this worker and not yet written to the database"""
+    return usage_counters.get_stats()
+
 @router.post("/admin/approved-answers")
 async def create_approved_answer(answer: ApprovedAnswerRequest):
     """Create a new approved answer"""
@@ -149,6 +161,7 @@ async def create_approved_answer(answer: ApprovedAnswerRequest):
         
         await db.approved_answers.insert_one(answer_record)
         answer_record.pop("_id", None)
+        await bump_version(db, APPROVED_ANSWERS, [answer_record["id"]])
         
         return {"success": True, "answer": answer_record}
     except Exception as e:
@@ -170,6 +183,7 @@ async def update_approved_answer(answer_id: str, update: ApprovedAnswerUpdate):
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Answer not found")
         
+        await bump_version(db, APPROVED_ANSWERS, [answer_id])
         return {"success": True}
     except HTTPException:
         raise
@@ -186,6 +200,7 @@ async def delete_approved_answer(answer_id: str):
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Answer not found")
         
+        await bump_version(db, APPROVED_ANSWERS, [answer_id])
         return {"success": True}
     except HTTPException:
         raise
@@ -240,6 +255,7 @@ async def approve_learning_item(item_id: str, improved_answer: Optional[str] = N
                 "updated_at": datetime.utcnow()
             }
             await db.approved_answers.insert_one(answer_record)
+            await bump_version(db, APPROVED_ANSWERS, [answer_record["id"]])
         
         return {"success": True}
     except HTTPException:
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Store conversation memory on sessions that do not have it yet.
+
+Chat turns keep conversation_memory up to date from each new message; this
+builds it once from the full transcript of sessions written before that,
+or whose memory no longer matches their message count. A session that
+receives a turn while it is being processed is left to that turn.
+
+    python backend/scripts/backfill_conversation_memory.py --dry-run
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from chatbot.conversation_memory import build_memory  # noqa: E402
+from chatbot.message_store import load_range  # noqa: E402
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+
+
+async def transcript(db, session):
+    if "message_count" not in session:
+        # Not moved into buckets yet
+        return session.get("messages", [])
+    return await load_range(db, session["session_id"], 0, session["message_count"] - 1)
+
+
+async def backfill(dry_run: bool, batch_size: int):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'zentiam_db')]
+    try:
+        await backfill_sessions(db, dry_run, batch_size)
+    finally:
+        client.close()
+
+
+async def backfill_sessions(db, dry_run: bool, batch_size: int):
+    scanned = updated = skipped = 0
+    cursor = db.chat_sessions.find(
+        {},
+        {"_id": 0, "session_id": 1, "message_count": 1, "messages": 1, "conversation_memory.messages_seen": 1}
+    ).batch_size(batch_size)
+    async for session in cursor:
+        scanned += 1
+        count = session.get("message_count", len(session.get("messages", [])))
+        if (session.get("conversation_memory") or {}).get("messages_seen") == count:
+            continue
+
+        memory = build_memory(await transcript(db, session), count)
+        if dry_run:
+            updated += 1
+            continue
+
+        # Only if no turn has been stored since the transcript was read
+        count_filter = {"message_count": count} if "message_count" in session else {"message_count": {"$exists": False}}
+        result = await db.chat_sessions.update_one(
+            {"session_id": session["session_id"], **count_filter},
+            {"$set": {"conversation_memory": memory}}
+        )
+        if result.modified_count:
+            updated += 1
+        else:
+            skipped += 1
+
+    action = "Would update" if dry_run else "Updated"
+    print(f"Scanned {scanned} sessions. {action} {updated}, skipped {skipped} changed meanwhile.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(backfill(args.dry_run, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,10 @@ from email_template_routes import router as email_template_router
 from project_docs_routes import router as project_docs_router
 from sheets_routes import router as sheets_router
 from feedback_routes import router as feedback_router
+from chatbot.document_parser import document_parser
+from chatbot.usage_counters import usage_counters
+from chatbot.message_store import ensure_indexes as ensure_message_indexes
+from chatbot.llm_client import llm_client
 
 
 ROOT_DIR = Path(__file__).parent
@@ -110,6 +114,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_usage_counters():
+    usage_counters.start(db)
+
+@app.on_event("startup")
+async def create_chat_message_indexes():
+    try:
+        await ensure_message_indexes(db)
+    except Exception as e:
+        logger.warning(f"Could not create chat message indexes: {e}")
+
+@app.on_event("startup")
+async def warm_llm_client():
+    try:
+        llm_client.warm()
+        logger.info("LLM transport ready")
+    except Exception as e:
+        # Without a key the first chat request reports the error as before
+        logger.warning(f"Could not set up LLM transport: {e}")
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm_client.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Pending usage counts need the client, so flush them before closing it
+    await usage_counters.stop()
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_document_parser():
+    document_parser.shutdown()
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
+from typing import Literal
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
@@ -28,6 +29,9 @@ class EmailConfig(BaseModel):
 class GoogleSheetConfig(BaseModel):
     url: str
 
+class ChatbotAnswerModeConfig(BaseModel):
+    mode: Literal["auto", "llm", "extractive"]
+
 @router.get("")
 async def get_settings():
     """
@@ -44,12 +48,14 @@ async def get_settings():
                     "fromEmail": "noreply@zentiam.com",
                     "fromName": "Zentiam"
                 },
-                "google_sheet_url": ""
+                "google_sheet_url": "",
+                "chatbot_answer_mode": os.environ.get('CHATBOT_ANSWER_MODE', 'auto')
             }
         
         return {
             "email_config": settings.get("email_config", {}),
-            "google_sheet_url": settings.get("google_sheet_url", "")
+            "google_sheet_url": settings.get("google_sheet_url", ""),
+            "chatbot_answer_mode": settings.get("chatbot_answer_mode", os.environ.get('CHATBOT_ANSWER_MODE', 'auto'))
         }
     except Exception as e:
         logger.error(f"Error getting settings: {e}")
@@ -119,3 +125,26 @@ async def save_google_sheet_url(config: GoogleSheetConfig):
     except Exception as e:
         logger.error(f"Error saving Google Sheet URL: {e}")
         raise HTTPException(status_code=500, detail="Failed to save Google Sheet URL")
+
+@router.post("/chatbot-answer-mode")
+async def save_chatbot_answer_mode(config: ChatbotAnswerModeConfig):
+    """
+    Save chatbot answer mode: "auto" sheds load to extractive answers when the
+    LLM is saturated, "llm" never sheds, "extractive" never calls the LLM
+    """
+    try:
+        await db.settings.update_one(
+            {"type": "system"},
+            {
+                "$set": {
+                    "chatbot_answer_mode": config.mode
+                }
+            },
+            upsert=True
+        )
+        
+        logger.info(f"Chatbot answer mode set to {config.mode}")
+        return {"success": True, "message": "Chatbot answer mode saved successfully"}
+    except Exception as e:
+        logger.error(f"Error saving chatbot answer mode: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save chatbot answer mode")
@@ -7,6 +7,7 @@ import json
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from chatbot.google_sheets_service import google_sheets_service
+from chatbot.message_store import ensure_bucketed, load_range
 
 logger = logging.getLogger(__name__)
 
@@ -135,6 +136,9 @@ async def sync_sessions(request: SyncRequest = None):
         
         for session in sessions:
             try:
+                # The lead summary reads the whole conversation
+                session = await ensure_bucketed(db, session)
+                session["messages"] = await load_range(db, session["session_id"], 0, session["message_count"] - 1)
                 success = google_sheets_service.log_chat_session(session)
                 if success:
                     # Mark as synced
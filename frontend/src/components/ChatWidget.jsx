@@ -5,6 +5,25 @@ import ReactMarkdown from 'react-markdown';
 
 const API = process.env.REACT_APP_BACKEND_URL ? `${process.env.REACT_APP_BACKEND_URL}/api` : 'http://localhost:8001/api';
 
+// Calls onEvent with each JSON event of a Server-Sent Events response
+const readEvents = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    events.forEach((event) => {
+      if (event.startsWith('data: ')) {
+        onEvent(JSON.parse(event.slice(6)));
+      }
+    });
+  }
+};
+
 function ChatWidget() {
   const [isOpen, setIsOpen] = useState(false);
   const [messages, setMessages] = useState([]);
@@ -82,19 +101,48 @@ function ChatWidget() {
     setInputMessage('');
     setIsLoading(true);
 
+    // The reply is shown from its first token and replaced as more arrives
+    let reply = null;
+    const replyTimestamp = new Date();
+    const showReply = (text) => {
+      const botMessage = { sender: 'bot', text, timestamp: replyTimestamp };
+      const isNew = reply === null;
+      reply = text;
+      setMessages((prev) => (isNew ? [...prev, botMessage] : [...prev.slice(0, -1), botMessage]));
+    };
+
     try {
-      const response = await axios.post(`${API}/chatbot/chat`, {
-        session_id: sessionId,
-        message: inputMessage
+      const response = await fetch(`${API}/chatbot/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          session_id: sessionId,
+          message: inputMessage
+        })
       });
+      if (!response.ok) {
+        throw new Error(`Chat request failed with status ${response.status}`);
+      }
 
-      const botMessage = {
-        sender: 'bot',
-        text: response.data.response,
-        timestamp: new Date()
-      };
-
-      setMessages((prev) => [...prev, botMessage]);
+      let finished = false;
+      await readEvents(response, (event) => {
+        if (event.type === 'token') {
+          showReply((reply || '') + event.text);
+        } else if (event.type === 'reset') {
+          // The streamed text was abandoned; the full reply follows
+          showReply('');
+        } else if (event.type === 'done') {
+          finished = true;
+          showReply(event.response);
+        } else if (event.type === 'error') {
+          throw new Error(event.detail);
+        }
+      });
+      if (!finished) {
+        throw new Error('Chat stream ended before the reply was complete');
+      }
     } catch (error) {
       console.error('Error sending message:', error);
       const errorMessage = {
@@ -102,7 +150,9 @@ function ChatWidget() {
         text: "I apologize, but I'm having trouble responding right now. Please try again.",
         timestamp: new Date()
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      // A partly streamed reply is replaced rather than left above the error
+      const partial = reply !== null;
+      setMessages((prev) => [...(partial ? prev.slice(0, -1) : prev), errorMessage]);
     } finally {
       setIsLoading(false);
       // Focus will be restored by the useEffect above
@@ -325,7 +375,7 @@ function ChatWidget() {
                 </div>
               </div>
             ))}
-            {isLoading && (
+            {isLoading && messages[messages.length - 1]?.sender !== 'bot' && (
               <div style={{ display: 'flex', alignItems: 'center', gap: '0.5rem' }}>
                 <Loader2 size={16} className="spin" style={{ color: 'rgba(255, 255, 255, 0.75)' }} />
                 <span style={{ fontSize: '0.875rem', color: 'rgba(255, 255, 255, 0.75)' }}>Typing...</span>
@@ -11,6 +11,7 @@ const ChatSessions = () => {
   const [sessions, setSessions] = useState([]);
   const [selectedSession, setSelectedSession] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingOlder, setLoadingOlder] = useState(false);
 
   useEffect(() => {
     if (!localStorage.getItem('adminAuth')) {
@@ -40,6 +41,29 @@ const ChatSessions = () => {
     }
   };
 
+  // Long transcripts come in pages; next_cursor points at the page before the oldest one shown
+  const loadOlderMessages = async () => {
+    if (selectedSession?.next_cursor == null) return;
+    const sessionId = selectedSession.session_id;
+    setLoadingOlder(true);
+    try {
+      const response = await axios.get(`${API}/chatbot/session/${sessionId}/messages`, {
+        params: { cursor: selectedSession.next_cursor }
+      });
+      setSelectedSession(current => current?.session_id !== sessionId ? current : {
+        ...current,
+        messages: [...response.data.messages, ...(current.messages || [])],
+        next_cursor: response.data.next_cursor
+      });
+    } catch (error) {
+      console.error('Error fetching older messages:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  const messageCount = (session) => session.message_count ?? session.messages?.length ?? 0;
+
   const exportToCSV = () => {
     const headers = ['Date', 'Name', 'Email', 'Phone', 'Messages', 'Answered', 'Unanswered'];
     const rows = sessions.map(s => [
@@ -47,7 +71,7 @@ const ChatSessions = () => {
       s.user_name || 'Anonymous',
       s.user_email || 'N/A',
       s.user_phone || 'N/A',
-      s.messages?.length || 0,
+      messageCount(s),
       s.answered_questions?.length || 0,
       s.unanswered_questions?.length || 0
     ]);
@@ -128,7 +152,7 @@ const ChatSessions = () => {
                             {session.user_email || 'No email provided'}
                           </p>
                           <p className="caption" style={{ color: 'var(--text-muted)' }}>
-                            {session.messages?.length || 0} messages • {new Date(session.created_at).toLocaleDateString()}
+                            {messageCount(session)} messages • {new Date(session.created_at).toLocaleDateString()}
                           </p>
                         </div>
                       </div>
@@ -167,9 +191,19 @@ const ChatSessions = () => {
 
                 {/* Messages */}
                 <div style={{ display: 'flex', flexDirection: 'column', gap: '1rem' }}>
+                  {selectedSession.next_cursor != null && (
+                    <button
+                      onClick={loadOlderMessages}
+                      disabled={loadingOlder}
+                      className="btn-secondary button-text"
+                      style={{ alignSelf: 'center' }}
+                    >
+                      {loadingOlder ? 'Loading...' : 'Load older messages'}
+                    </button>
+                  )}
                   {selectedSession.messages?.map((msg, index) => (
                     <div
-                      key={index}
+                      key={msg.seq ?? index}
                       style={{
                         display: 'flex',
                         flexDirection: 'column',